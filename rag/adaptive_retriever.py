@@ -0,0 +1,128 @@
+import logging
+import threading
+
+from langchain_core.retrievers import BaseRetriever
+from pydantic import PrivateAttr
+
+from tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+
+def chroma_cosine_similarity(vector_store, distance):
+    """
+    Convert a Chroma distance to cosine similarity
+
+    Chroma collections use squared L2 distance unless created with another
+    "hnsw:space". For unit-length embeddings (OpenAI embeddings are) squared
+    L2 is 2 - 2 * cosine, and the cosine and inner-product spaces return
+    1 - similarity.
+    """
+    metadata = getattr(getattr(vector_store, "_collection", None), "metadata", None) or {}
+    if metadata.get("hnsw:space", "l2") == "l2":
+        return 1.0 - distance / 2.0
+    return 1.0 - distance
+
+
+class AdaptiveRetriever(BaseRetriever):
+    """
+    Retrieve as many chunks as the question needs instead of a fixed k
+
+    The best max_k candidates are taken in order of relevance while their
+    relevance score is at least score_threshold and their total token count
+    (measured with the local tokenizer) fits in max_tokens. At least min_k
+    chunks are always returned. Every query logs the tokens sent against the
+    tokens the fixed baseline_k retriever would have sent, and stats() counts
+    the chosen k and what stopped the selection.
+
+    Scores are cosine similarities for every backend: in-process stores
+    return them directly and Chroma distances are converted (see
+    chroma_cosine_similarity), so one threshold means the same on both.
+    Other stores fall back to their own relevance scores.
+
+    Args:
+        vector_store: Store searched for candidates
+        score_threshold: Minimum cosine similarity of a chunk beyond the first min_k
+        max_tokens: Token budget for the selected chunks
+        min_k: Number of chunks returned regardless of the threshold, budget permitting
+        max_k: Number of candidates considered
+        baseline_k: Fixed k the token counts are compared with
+        model: Model whose tokenizer is used for counting
+    """
+
+    vector_store: object
+    score_threshold: float = 0.3
+    max_tokens: int = 1500
+    min_k: int = 1
+    max_k: int = 10
+    baseline_k: int = 2
+    model: str = "gpt-4o-mini"
+
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    _totals: dict = PrivateAttr(default_factory=lambda: {'queries': 0, 'chunks': 0, 'tokens': 0, 'baseline_tokens': 0})
+    # Number of queries per chosen k, and per reason the selection stopped
+    _k_counts: dict = PrivateAttr(default_factory=dict)
+    _stop_reasons: dict = PrivateAttr(default_factory=lambda: {'threshold': 0, 'budget': 0, 'max_k': 0})
+
+    def _select(self, query, candidates):
+        """Pick chunks from (document, score) candidates sorted by decreasing relevance"""
+        selected, tokens, stop_reason = [], 0, "max_k"
+        token_counts = [count_tokens(doc.page_content, self.model) for doc, _ in candidates]
+        for (doc, score), doc_tokens in zip(candidates, token_counts):
+            if len(selected) >= self.min_k and score < self.score_threshold:
+                stop_reason = "threshold"
+                break
+            if tokens + doc_tokens > self.max_tokens:
+                stop_reason = "budget"
+                break
+            selected.append(doc)
+            tokens += doc_tokens
+
+        baseline_tokens = sum(token_counts[:self.baseline_k])
+        with self._lock:
+            self._totals['queries'] += 1
+            self._totals['chunks'] += len(selected)
+            self._totals['tokens'] += tokens
+            self._totals['baseline_tokens'] += baseline_tokens
+            self._k_counts[len(selected)] = self._k_counts.get(len(selected), 0) + 1
+            self._stop_reasons[stop_reason] += 1
+        logger.info("Adaptive retrieval for %r: k=%d, %d tokens (fixed k=%d: %d tokens)",
+                    query, len(selected), tokens, self.baseline_k, baseline_tokens)
+        return selected
+
+    def _candidates(self, queries):
+        """Top max_k (document, relevance) pairs for every query"""
+        batch_search = getattr(self.vector_store, "batch_similarity_search_with_score", None)
+        if batch_search is not None:
+            # In-process stores score with cosine similarity, which is already a relevance
+            # score, and embed all queries in one request
+            return batch_search(queries, k=self.max_k)
+        if getattr(self.vector_store, "_collection", None) is not None:
+            return [
+                [(doc, chroma_cosine_similarity(self.vector_store, distance))
+                 for doc, distance in self.vector_store.similarity_search_with_score(query, k=self.max_k)]
+                for query in queries
+            ]
+        return [self.vector_store.similarity_search_with_relevance_scores(query, k=self.max_k) for query in queries]
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        return self._select(query, self._candidates([query])[0])
+
+    def batch(self, inputs, config=None, *, return_exceptions=False, **kwargs):
+        inputs = list(inputs)
+        return [self._select(query, candidates) for query, candidates in zip(inputs, self._candidates(inputs))]
+
+    def stats(self):
+        """Return token totals compared with the fixed-k baseline, and how often each k was chosen"""
+        with self._lock:
+            totals = dict(self._totals)
+            k_counts = dict(sorted(self._k_counts.items()))
+            stop_reasons = dict(self._stop_reasons)
+        queries = totals['queries']
+        return {
+            **totals,
+            'mean_k': totals['chunks'] / queries if queries else 0.0,
+            'tokens_saved': totals['baseline_tokens'] - totals['tokens'],
+            'k_counts': k_counts,
+            'stopped_by': stop_reasons,
+        }
@@ -1,6 +1,9 @@
 # Load environment variables from .env file
 from dotenv import load_dotenv
+import argparse
 import os
+import time
+from functools import partial
 load_dotenv("/Users/jayantkapoor/Documents/GitHub/w25-llm-tutorials/.env")
 
 print(os.getenv('OPENAI_API_KEY'))
@@ -11,54 +14,199 @@ print(os.getenv('LANGSMITH_PROJECT'))
 
 # Import required langchain components
 from langchain_openai import ChatOpenAI, OpenAIEmbeddings
-from langchain_chroma import Chroma
 from langchain_community.document_loaders import TextLoader
 from langchain_text_splitters import CharacterTextSplitter, RecursiveCharacterTextSplitter
 from langchain_core.messages import SystemMessage, HumanMessage
+from pydantic import BaseModel, Field
 import yaml
 from rouge_score import rouge_scorer
+from embedding_cache import CachedEmbeddings, DEFAULT_CACHE_DIR
+from incremental_index import incremental_ingest, print_ingest_report
+from corpus_ingest import find_corpus_files, ingest_corpus, is_corpus_path, print_corpus_report
+from ingest_pipeline import IngestPipeline, print_pipeline_metrics
+from batched_embeddings import BatchedEmbeddings
+from rag_components import INDEX_BACKENDS, create_retriever, create_vector_store
+from prompts import SYSTEM_PROMPT
+from semantic_cache import SemanticAnswerCache, answer_fingerprint
+from query_cache import CachedRetriever, QueryEmbeddingCache
+from context_assembly import assemble_context, summarize_context_reports
+from adaptive_retriever import AdaptiveRetriever
+from dedup import NearDuplicateFilter, print_dedup_report
+from concurrent_eval import print_concurrency_report, run_concurrently
+from tokens import count_tokens
+from claim_store import ClaimStore
+from results_store import ResultsStore, print_results_summary
+from bulk_rouge import bulk_rouge_scores
+from instrumentation import NULL_TRACER, TracedEmbeddings, Tracer, print_trace_summary
 
-def create_rag_system(file_path):
-    """Initialize the RAG system components"""
+QA_PAIRS_PATH = "/Users/jayantkapoor/Documents/GitHub/w25-llm-tutorials/rag/data/qa_pairs_test.yaml"
+
+def create_rag_system(file_path, embedding_cache_path=None, persist_directory=None, max_workers=None,
+                      streaming=False, embed_batch_size=256, max_in_flight=4, index_backend="chroma",
+                      index_dtype="float32", index_params=None, snapshot_path=None, embedding_dimensions=None,
+                      retrieval_mode="dense", query_cache_size=None, retrieval_params=None,
+                      dedup_threshold=None, tracer=None, prune_missing=False, answer_cache_path=None):
+    """
+    Initialize the RAG system components
+    
+    Args:
+        file_path: Path of the text file to index, or a directory / glob pattern of files
+        embedding_cache_path: Optional path of an on-disk embedding cache. When set,
+            chunks that were embedded by an earlier run are served from disk.
+        persist_directory: Optional directory for a persisted vector store. When set,
+            the file is ingested incrementally: only new or changed chunks are
+            upserted and removed chunks are deleted.
+        max_workers: Number of processes used to load and split a multi-file corpus
+        streaming: Ingest through a staged load -> split -> embed -> upsert pipeline
+            connected by bounded queues, keeping memory flat for large corpora
+        embed_batch_size: Maximum number of chunks per embedding request
+        max_in_flight: Maximum number of concurrent embedding requests
+        index_backend: "chroma", "numpy" for a lightweight in-memory exact index, or
+            "ivf" for an approximate nearest-neighbour index on large corpora, or "quantized"
+            for int8 / binary codes with full-precision rescoring (requires snapshot_path, so
+            only the codes stay in RAM), or "matryoshka" to search at
+            reduced dimension and re-rank at full dimension
+        index_dtype: Storage type of the in-process index matrix, "float32" or "float16"
+        index_params: Extra index parameters, e.g. {"n_lists": 1024, "n_probe": 16} for ivf
+            or {"quantization": "binary", "rescore_factor": 8} for quantized, or
+            {"search_dimensions": 256, "rescore_factor": 4} for matryoshka
+        snapshot_path: Optional index snapshot file for in-process backends. If it exists it
+            is memory-mapped instead of ingesting the corpus, otherwise it is written after
+            ingestion and reopened memory-mapped. Delete the file to rebuild it after the
+            corpus changed.
+        embedding_dimensions: Optional reduced embedding size (e.g. 256) for both ingestion
+            and querying; text-embedding-3 models return shortened vectors natively
+        retrieval_mode: "dense" for vector search, "bm25" for lexical search over an in-process
+            inverted index, "hybrid" to fuse both with reciprocal rank fusion, "adaptive"
+            to pick chunks by score threshold and token budget instead of a fixed k, or "mmr"
+            to re-rank a larger candidate pool by maximal marginal relevance so near-identical
+            overlapping chunks do not fill the k slots
+        query_cache_size: Optional number of questions whose embeddings and retrieved chunks
+            are kept in memory. Entries are keyed on the normalized question and the index
+            version, so results are recomputed automatically after the index changes.
+        retrieval_params: Extra retriever parameters, e.g. {"score_threshold": 0.4,
+            "max_tokens": 1500} for adaptive or {"fetch_k": 20, "lambda_mult": 0.5} for mmr
+        dedup_threshold: Optional MinHash Jaccard similarity (e.g. 0.8) at or above which a
+            split is dropped as a near duplicate of an earlier one before it is embedded.
+            Not supported with persist_directory, where unchanged files are not re-split.
+        tracer: Optional Tracer; query embeddings are recorded as "query_embedding" spans
+        prune_missing: With persist_directory, delete the chunks of files that were indexed
+            by an earlier run but are no longer matched by file_path
+        answer_cache_path: Optional SQLite file of a SemanticAnswerCache for answer_question.
+            Its fingerprint is taken from the LLM, SYSTEM_PROMPT and the indexed chunks, so
+            stored answers are only served while none of them changed.
+    
+    Returns:
+        tuple: (llm, retriever), or (llm, retriever, answer_cache) when answer_cache_path is set
+    """
     
     # Initialize the LLM and embeddings model
     llm = ChatOpenAI(model="gpt-4o-mini", temperature=0)
-    embeddings = OpenAIEmbeddings(model="text-embedding-3-large")
-    
-    # Load and split the document
-    loader = TextLoader(file_path)
-    documents = loader.load()
+    if embedding_dimensions:
+        embeddings = OpenAIEmbeddings(model="text-embedding-3-large", dimensions=embedding_dimensions)
+    else:
+        embeddings = OpenAIEmbeddings(model="text-embedding-3-large")
+    # Send chunks in concurrent batches, retrying failed batches only
+    embeddings = BatchedEmbeddings(embeddings, batch_size=embed_batch_size, max_in_flight=max_in_flight)
+    if embedding_cache_path:
+        # Serve unchanged chunks from disk, only new text is sent to the API
+        embeddings = CachedEmbeddings(embeddings, path=embedding_cache_path)
+    embedding_cache = embeddings if embedding_cache_path else None
+    if query_cache_size:
+        # Repeated questions skip the embedding round trip
+        embeddings = QueryEmbeddingCache(embeddings, max_entries=query_cache_size)
+    if tracer is not None:
+        # Time query embeddings, cache hits included, separately from the vector search
+        embeddings = TracedEmbeddings(embeddings, tracer)
     
     # Split documents into chunks
     # text_splitter = CharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-    splits = text_splitter.split_documents(documents)
-    # Print each document split with a separator for readability
-    for i, split in enumerate(splits, 1):
-        print(f"\n{'='*80}\nDocument Split #{i}\n{'='*80}\n")
-        print(split.page_content)
-        print()
-    # Create and populate the vector store
-    vector_store = Chroma(embedding_function=embeddings)
-    vector_store.add_documents(documents=splits)
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200, add_start_index=True)
+    
+    if snapshot_path and index_backend not in INDEX_BACKENDS:
+        raise ValueError(f"Index snapshots need an in-process backend, not {index_backend}")
+    if index_backend == "quantized" and not snapshot_path:
+        # Built in RAM the store holds the float32 matrix next to the codes, using more memory than numpy
+        raise ValueError("The quantized backend needs snapshot_path, so the full-precision vectors stay on disk")
+    snapshot_exists = bool(snapshot_path) and os.path.exists(snapshot_path)
+    if dedup_threshold and persist_directory:
+        raise ValueError("Near-duplicate filtering is not supported with incremental ingestion")
+    dedup = NearDuplicateFilter(threshold=dedup_threshold) if dedup_threshold else None
+    # Chunks per embedding request, used to estimate the requests saved by dedup
+    request_batch_size = embed_batch_size
+    
+    if snapshot_exists:
+        # Open the saved index: no re-reading, re-splitting or re-embedding
+        vector_store = INDEX_BACKENDS[index_backend].load(snapshot_path, embeddings)
+        print(f"Opened index snapshot {snapshot_path} with {len(vector_store)} chunks")
+    elif persist_directory:
+        # Incremental mode: only new or changed chunks are embedded and upserted
+        vector_store = create_vector_store(embeddings, index_backend, persist_directory)
+        report = incremental_ingest(
+            vector_store,
+            find_corpus_files(file_path),
+            text_splitter,
+            manifest_path=os.path.join(persist_directory, "manifest.json"),
+            prune_missing=prune_missing
+        )
+        print_ingest_report(report)
+    elif streaming:
+        # Streaming mode: stages overlap and bounded queues provide backpressure
+        vector_store = create_vector_store(embeddings, index_backend, index_dtype=index_dtype, index_params=index_params)
+        # One embed worker per allowed request, each sending one embed_batch_size request at a time
+        pipeline = IngestPipeline(
+            vector_store, embeddings, text_splitter, embed_batch_size=embed_batch_size, dedup=dedup,
+            embed_workers=max_in_flight
+        )
+        metrics = pipeline.run(find_corpus_files(file_path))
+        print_pipeline_metrics(metrics)
+    elif is_corpus_path(file_path):
+        # Corpus mode: load and split files over a process pool, add splits in batches
+        vector_store = create_vector_store(embeddings, index_backend, index_dtype=index_dtype, index_params=index_params)
+        stats = ingest_corpus(
+            vector_store, file_path, text_splitter, max_workers=max_workers, batch_size=embed_batch_size, dedup=dedup
+        )
+        print_corpus_report(stats)
+    else:
+        # Load and split the document
+        loader = TextLoader(file_path)
+        documents = loader.load()
+        splits = text_splitter.split_documents(documents)
+        if dedup is not None:
+            splits = dedup.filter(splits)
+        # Print each document split with a separator for readability
+        for i, split in enumerate(splits, 1):
+            print(f"\n{'='*80}\nDocument Split #{i}\n{'='*80}\n")
+            print(split.page_content)
+            print()
+        # Create and populate the vector store
+        vector_store = create_vector_store(embeddings, index_backend, index_dtype=index_dtype, index_params=index_params)
+        vector_store.add_documents(documents=splits)
+    if dedup is not None and not snapshot_exists:
+        print_dedup_report(dedup.report(request_batch_size))
+    if snapshot_path and not snapshot_exists:
+        vector_store.save(snapshot_path)
+        # Reopen memory-mapped, so the first run holds no more in RAM than later ones
+        vector_store = INDEX_BACKENDS[index_backend].load(snapshot_path, embeddings)
+    if embedding_cache is not None:
+        print(f"Embedding cache: {embedding_cache.stats()}")
     
     # Create a retriever from the vector store
-    retriever = vector_store.as_retriever(search_kwargs={"k": 2})
+    retriever = create_retriever(vector_store, retrieval_mode, retrieval_params, query_cache_size)
     
+    if answer_cache_path:
+        answer_cache = SemanticAnswerCache(
+            embeddings, answer_fingerprint(llm, SYSTEM_PROMPT, vector_store), path=answer_cache_path
+        )
+        return llm, retriever, answer_cache
     return llm, retriever
 
-def get_response_from_llm(llm, context, question):
+def get_response_from_llm(llm, context, question, tracer=None):
     """Get response from LLM using context and question"""
-    
-    system_prompt = """You are an assistant for question-answering tasks. 
-    Use the following pieces of retrieved context to answer the question. 
-    If you are not able to find the answer in the retrieved context, just say that you don't know. 
-    Keep the answer concise and to the point.
-    
-    Context: {context}"""
+    tracer = tracer or NULL_TRACER
     
     # Format the system prompt with context
-    system_prompt_filled = system_prompt.format(context=context)
+    system_prompt_filled = SYSTEM_PROMPT.format(context=context)
     
     # Create messages for the chat model
     messages = [
@@ -67,25 +215,81 @@ def get_response_from_llm(llm, context, question):
     ]
     
     # Get response from LLM
-    response = llm.invoke(messages)
+    with tracer.span("llm_invoke") as span:
+        response = llm.invoke(messages)
+        if tracer.enabled:
+            span.set(**response_token_counts(response, system_prompt_filled + question))
     
     return response.content
 
-def answer_question(llm, retriever, question):
-    """Answer a question using the RAG system"""
-    
-    # Retrieve relevant documents
-    retrieved_docs = retriever.get_relevant_documents(question)
+def response_token_counts(response, prompt):
+    """Prompt and completion tokens of a chat response, counted locally if the model did not report them"""
+    usage = getattr(response, "usage_metadata", None) or {}
+    prompt_tokens = usage.get('input_tokens')
+    completion_tokens = usage.get('output_tokens')
+    return {
+        'prompt_tokens': prompt_tokens if prompt_tokens is not None else count_tokens(prompt),
+        'completion_tokens': completion_tokens if completion_tokens is not None else count_tokens(response.content),
+    }
+
+def answer_question(llm, retriever, question, answer_cache=None, max_prompt_tokens=None, tracer=None,
+                    return_context_report=False):
+    """
+    Answer a question using the RAG system
     
-    # Combine retrieved documents into context
-    context = "\n\n".join(doc.page_content for doc in retrieved_docs)
+    Args:
+        llm: Chat model used to generate the answer
+        retriever: Retriever returning the context chunks
+        question: The question to answer
+        answer_cache: Optional SemanticAnswerCache. Paraphrases of earlier questions are
+            answered from the cache without retrieval or an LLM call.
+        max_prompt_tokens: Optional token budget for the system prompt, template included.
+            The least relevant passages are left out of the context to stay within it.
+        tracer: Optional Tracer recording a span per stage: "retrieval" (its self time is the
+            vector search, query embeddings are nested "query_embedding" spans when the
+            retriever's embeddings are traced), "prompt_assembly" and "llm_invoke"
+        return_context_report: Also return the assemble_context() report (tokens saved by
+            merging overlapping chunks), None for answers served from answer_cache
     
-    # Get response from LLM
-    answer = get_response_from_llm(llm, context, question)
+    Returns:
+        tuple: (answer, context), or (answer, context, context_report)
+    """
+    tracer = tracer or NULL_TRACER
+    with tracer.span("answer_question"):
+        if answer_cache is not None:
+            with tracer.span("answer_cache_lookup") as span:
+                hit, question_vector = answer_cache.lookup(question)
+                span.set(hit=hit is not None)
+            if hit is not None:
+                if return_context_report:
+                    return hit['answer'], hit['context'], None
+                return hit['answer'], hit['context']
+            start = time.perf_counter()
+        
+        # Retrieve relevant documents
+        with tracer.span("retrieval") as span:
+            retrieved_docs = retriever.get_relevant_documents(question)
+            span.set(chunks=len(retrieved_docs))
+        
+        # Combine retrieved documents into context, merging overlapping chunks
+        with tracer.span("prompt_assembly") as span:
+            context_budget = None
+            if max_prompt_tokens is not None:
+                context_budget = max_prompt_tokens - count_tokens(SYSTEM_PROMPT.format(context=""))
+            context, context_report = assemble_context(retrieved_docs, max_tokens=context_budget)
+            span.set(context_tokens=context_report['context_tokens'])
+        
+        # Get response from LLM
+        answer = get_response_from_llm(llm, context, question, tracer=tracer)
+        
+        if answer_cache is not None:
+            answer_cache.add(question, question_vector, answer, context, time.perf_counter() - start)
     
+    if return_context_report:
+        return answer, context, context_report
     return answer, context
 
-def evaluate_with_rouge(predictions):
+def evaluate_with_rouge(predictions, bulk=False, max_workers=None):
     """
     Evaluate RAG system predictions using ROUGE metrics
     
@@ -97,10 +301,27 @@ def evaluate_with_rouge(predictions):
             - ground_truth: Ground truth answer
             - predicted: Model's predicted answer
             - context: Retrieved context used for answer
+        bulk: Score with bulk_rouge_scores(): cached reference tokens and a process pool,
+            identical scores, for large regression sets
+        max_workers: Number of worker processes used by the bulk path
     
     Returns:
         tuple: (detailed_results, average_scores)
     """
+    if bulk:
+        bulk_scores = bulk_rouge_scores(
+            [pred['ground_truth'] for pred in predictions],
+            [pred['predicted'] for pred in predictions],
+            max_workers=max_workers,
+            reference_cache_path=os.path.join(DEFAULT_CACHE_DIR, "rouge_references.json")
+        )
+        results = [{**pred, 'rouge_scores': scores} for pred, scores in zip(predictions, bulk_scores)]
+        avg_scores = {
+            rouge_type: sum(result['rouge_scores'][rouge_type] for result in results) / len(predictions)
+            for rouge_type in ('rouge1', 'rouge2', 'rougeL')
+        }
+        return results, avg_scores
+    
     # Initialize ROUGE scorer
     # ROUGE (Recall-Oriented Understudy for Gisting Evaluation) metrics measure the quality of text by comparing it to reference text
     # rouge1: Measures overlap of individual words (unigrams) between the generated and reference texts
@@ -168,6 +389,9 @@ def print_rouge_evaluation(results, avg_scores):
         print(f"  ROUGE-L: {result['rouge_scores']['rougeL']:.4f}")
         print(f"  Context: {result['context']}")
 
+# Bump when the extract_claims prompt changes, so stored reference claims are extracted again
+CLAIM_PROMPT_VERSION = 1
+
 def extract_claims(llm, text):
     """Extract atomic claims from a piece of text using the LLM"""
     
@@ -237,48 +461,179 @@ def check_claim_entailment(llm, claim, reference_claims):
     # Check if response starts with 'Yes'
     return response.content.strip().lower().startswith('yes')
 
-def evaluate_factual_correctness(llm, predictions):
+class ClaimJudgment(BaseModel):
+    """Entailment verdict for one numbered claim"""
+    claim_number: int = Field(description="Number of the claim in the list, starting at 1")
+    entailed: bool = Field(description="True if the claim is fully supported by the reference claims")
+
+class ClaimJudgments(BaseModel):
+    """Entailment verdicts for every claim in the list"""
+    judgments: list[ClaimJudgment]
+
+def check_claims_entailment(llm, claims, reference_claims):
+    """Check which of several claims are entailed by the reference claims, in one LLM call"""
+    
+    system_prompt = """You are a precise natural language inference system.
+    For each numbered claim, determine if it is entailed by (logically follows from) any of the reference claims.
+    
+    A claim is entailed if it is logically necessary given the reference claims.
+    The claim must be fully supported by the references, not just partially or possibly true.
+    Judge every claim independently.
+    
+    Claims:
+    {claims}
+    
+    Reference Claims:
+    {references}"""
+    
+    formatted_claims = "\n".join(f"{i}. {claim}" for i, claim in enumerate(claims, 1))
+    formatted_refs = "\n".join(f"- {ref}" for ref in reference_claims)
+    
+    messages = [
+        SystemMessage(content=system_prompt.format(
+            claims=formatted_claims,
+            references=formatted_refs
+        )),
+        HumanMessage(content="Which claims are entailed by the reference claims?")
+    ]
+    
+    response = llm.with_structured_output(ClaimJudgments).invoke(messages)
+    
+    # Claims the model skipped count as not entailed
+    entailed = {judgment.claim_number: judgment.entailed for judgment in response.judgments}
+    return [entailed.get(i, False) for i in range(1, len(claims) + 1)]
+
+def score_factual_correctness(llm, pred, batched=False, claim_store=None):
+    """
+    Score one prediction by the fraction of its claims entailed by the reference claims
+    
+    Args:
+        llm: Chat model used for claim extraction and entailment
+        pred: Prediction with ground truth and predicted answers
+        batched: Judge all predicted claims in one structured-output call instead of one call per claim
+        claim_store: Optional ClaimStore the ground-truth claims are read from (see prepare_dataset)
+    """
+    # Extract claims from both predicted and ground truth answers
+    predicted_claims = extract_claims(llm, pred['predicted'])
+    if claim_store is not None:
+        reference_claims, cached = claim_store.get_or_extract(
+            llm, pred['ground_truth'], extract_claims, CLAIM_PROMPT_VERSION
+        )
+    else:
+        reference_claims, cached = extract_claims(llm, pred['ground_truth']), False
+    extraction_calls = 1 if cached else 2
+    llm_calls = extraction_calls
+    
+    if not predicted_claims:  # If no claims were extracted
+        factual_score = 0
+    elif batched:
+        correct_claims = sum(check_claims_entailment(llm, predicted_claims, reference_claims))
+        factual_score = correct_claims / len(predicted_claims)
+        llm_calls += 1
+    else:
+        # Check each predicted claim against reference claims
+        correct_claims = sum(
+            1 for claim in predicted_claims 
+            if check_claim_entailment(llm, claim, reference_claims)
+        )
+        factual_score = correct_claims / len(predicted_claims)
+        llm_calls += len(predicted_claims)
+    
+    return {
+        **pred,  # Include all original prediction data
+        'factual_score': factual_score,
+        'llm_calls': llm_calls,
+        'extraction_calls': extraction_calls,
+        'extracted_claims': {
+            'predicted': predicted_claims,
+            'reference': reference_claims
+        }
+    }
+
+def evaluate_factual_correctness(llm, predictions, batched=False, max_concurrency=None, claim_store=None):
     """
     Evaluate the factual correctness of predictions by comparing claims
     
     Args:
         predictions: List of dictionaries containing ground truth and predicted answers
+        batched: Judge all claims of a prediction in one structured-output call
+        max_concurrency: Optional number of predictions scored at the same time
+        claim_store: Optional ClaimStore of precomputed ground-truth claims
         
     Returns:
         tuple: (detailed_results, average_score)
     """
-    results = []
-    total_score = 0
-    
-    for pred in predictions:
-        # Extract claims from both predicted and ground truth answers
-        predicted_claims = extract_claims(llm, pred['predicted'])
-        reference_claims = extract_claims(llm, pred['ground_truth'])
-        
-        if not predicted_claims:  # If no claims were extracted
-            factual_score = 0
-        else:
-            # Check each predicted claim against reference claims
-            correct_claims = sum(
-                1 for claim in predicted_claims 
-                if check_claim_entailment(llm, claim, reference_claims)
-            )
-            factual_score = correct_claims / len(predicted_claims)
-        
-        result = {
-            **pred,  # Include all original prediction data
-            'factual_score': factual_score,
-            'extracted_claims': {
-                'predicted': predicted_claims,
-                'reference': reference_claims
-            }
-        }
-        results.append(result)
-        total_score += factual_score
-    
+    start_time = time.perf_counter()
+    score = partial(score_factual_correctness, llm, batched=batched, claim_store=claim_store)
+    if max_concurrency:
+        results, _ = run_concurrently(score, predictions, max_concurrency=max_concurrency)
+    else:
+        results = [score(pred) for pred in predictions]
+    wall_seconds = time.perf_counter() - start_time
+    
+    # Calls the per-claim path needs for the same claims, for comparison
+    llm_calls = sum(result['llm_calls'] for result in results)
+    per_claim_calls = sum(
+        result['extraction_calls'] + len(result['extracted_claims']['predicted']) for result in results
+    )
+    print(f"\nFactual evaluation: {llm_calls} LLM calls in {wall_seconds:.2f}s "
+          f"(per-claim entailment needs {per_claim_calls} calls)")
+    
+    total_score = sum(result['factual_score'] for result in results)
     avg_score = total_score / len(predictions) if predictions else 0
     return results, avg_score
 
+def prepare_dataset(llm, claim_store, qa_path=QA_PAIRS_PATH, max_concurrency=8):
+    """
+    Extract and store the claims of every ground-truth answer of a QA file
+    
+    Later evaluation runs passing the same claim_store only extract claims
+    from the predicted answers.
+    
+    Returns:
+        dict: Number of answers, newly extracted and already stored
+    """
+    with open(qa_path, "r") as file:
+        qa_pairs = yaml.safe_load(file)['qa_pairs']
+    answers = list(dict.fromkeys(qa_pair['answer'] for qa_pair in qa_pairs))
+    
+    def extract(answer):
+        return claim_store.get_or_extract(llm, answer, extract_claims, CLAIM_PROMPT_VERSION)
+    
+    results, _ = run_concurrently(extract, answers, max_concurrency=max_concurrency)
+    cached = sum(1 for _, was_cached in results if was_cached)
+    report = {'answers': len(answers), 'extracted': len(answers) - cached, 'already_stored': cached}
+    print(f"Prepared reference claims for {qa_path}: {report}")
+    return report
+
+def compare_factual_evaluation(llm, predictions, max_concurrency=8, claim_store=None):
+    """
+    Run the per-claim sequential path and the batched concurrent path on the same predictions
+    
+    Args:
+        max_concurrency: Number of predictions the batched path scores at the same time
+        claim_store: Optional ClaimStore of precomputed ground-truth claims, used by both paths
+    
+    Returns:
+        dict: LLM calls, wall time and average score of both paths
+    """
+    report = {}
+    for name, kwargs in (("per_claim", {}), ("batched", {'batched': True, 'max_concurrency': max_concurrency})):
+        start_time = time.perf_counter()
+        results, avg_score = evaluate_factual_correctness(llm, predictions, claim_store=claim_store, **kwargs)
+        report[name] = {
+            'llm_calls': sum(result['llm_calls'] for result in results),
+            'wall_seconds': time.perf_counter() - start_time,
+            'score': avg_score,
+        }
+    report['speedup'] = report['per_claim']['wall_seconds'] / report['batched']['wall_seconds']
+    print("\n=== Factual Evaluation: Per-Claim vs Batched ===")
+    for name in ("per_claim", "batched"):
+        print(f"{name}: {report[name]['llm_calls']} LLM calls, {report[name]['wall_seconds']:.2f}s, "
+              f"score {report[name]['score']:.4f}")
+    print(f"Speedup: {report['speedup']:.1f}x")
+    return report
+
 def print_factual_evaluation(results, avg_score):
     """Print factual correctness evaluation results"""
     print("\n=== Factual Correctness Evaluation Results ===")
@@ -300,34 +655,80 @@ def print_factual_evaluation(results, avg_score):
         for claim in result['extracted_claims']['reference']:
             print(f"    - {claim}")
 
-def evaluate_rag_system(llm, retriever):
-    """Evaluate the RAG system using predefined QA pairs"""
+def answer_qa_pair(llm, retriever, qa_pair, answer_cache=None, tracer=None):
+    """Answer one QA pair and return the prediction record used by the evaluations"""
+    predicted_answer, context, context_report = answer_question(
+        llm, retriever, qa_pair['question'], answer_cache=answer_cache, tracer=tracer, return_context_report=True
+    )
+    
+    return {
+        'question_id': qa_pair['id'],
+        'category': qa_pair['category'],
+        'question': qa_pair['question'],
+        'ground_truth': qa_pair['answer'],
+        'predicted': predicted_answer,
+        'context': context,
+        'context_report': context_report
+    }
+
+def evaluate_rag_system(llm, retriever, answer_cache=None, max_concurrency=None, requests_per_second=None,
+                        batched_entailment=False, claim_store=None, qa_path=QA_PAIRS_PATH, tracer=None):
+    """
+    Evaluate the RAG system using predefined QA pairs
+    
+    Args:
+        llm: Chat model used for answers and claim checks
+        retriever: Retriever returning the context chunks
+        answer_cache: Optional SemanticAnswerCache passed to answer_question
+        max_concurrency: Optional number of QA pairs answered at the same time. Predictions
+            keep the order of the QA file. The printed speedup is an estimate: the summed per-call
+            latencies stand in for a sequential run, which is only timed with max_concurrency unset.
+        requests_per_second: Optional cap on how many QA pairs start per second
+        batched_entailment: Judge all claims of an answer in one structured-output call
+        claim_store: Optional ClaimStore of precomputed ground-truth claims
+        qa_path: YAML file of QA pairs
+        tracer: Optional Tracer timing the stages of every answer; its summary is printed
+    """
     
     # Load QA pairs from YAML file
-    with open("/Users/jayantkapoor/Documents/GitHub/w25-llm-tutorials/rag/data/qa_pairs_test.yaml", "r") as file:
+    with open(qa_path, "r") as file:
         qa_data = yaml.safe_load(file)
     
     # Get predictions for all questions
-    predictions = []
-    for qa_pair in qa_data['qa_pairs']:
-        predicted_answer, context = answer_question(llm, retriever, qa_pair['question'])
-        
-        prediction = {
-            'question_id': qa_pair['id'],
-            'category': qa_pair['category'],
-            'question': qa_pair['question'],
-            'ground_truth': qa_pair['answer'],
-            'predicted': predicted_answer,
-            'context': context
-        }
-        predictions.append(prediction)
+    if max_concurrency:
+        # Overlap the retrieval and LLM round trips of many questions
+        predictions, report = run_concurrently(
+            partial(answer_qa_pair, llm, retriever, answer_cache=answer_cache, tracer=tracer),
+            qa_data['qa_pairs'],
+            max_concurrency=max_concurrency,
+            requests_per_second=requests_per_second
+        )
+        print_concurrency_report(report, "Concurrent Answering")
+    else:
+        predictions = []
+        for qa_pair in qa_data['qa_pairs']:
+            predictions.append(answer_qa_pair(llm, retriever, qa_pair, answer_cache=answer_cache, tracer=tracer))
+    print(f"Context assembly: {summarize_context_reports(p['context_report'] for p in predictions)}")
+    if isinstance(retriever, CachedRetriever):
+        print(f"Query cache: {retriever.stats()}")
+    base_retriever = retriever.retriever if isinstance(retriever, CachedRetriever) else retriever
+    if isinstance(base_retriever, AdaptiveRetriever):
+        print(f"Adaptive retrieval: {base_retriever.stats()}")
+    if answer_cache is not None:
+        print(f"Answer cache: {answer_cache.stats()}")
+    if tracer is not None:
+        print_trace_summary(tracer.summary())
     
     # Evaluate using ROUGE metrics
     rouge_results, rouge_scores = evaluate_with_rouge(predictions)
     print_rouge_evaluation(rouge_results, rouge_scores)
     
     # Evaluate using Factual Correctness
-    factual_results, factual_score = evaluate_factual_correctness(llm, predictions)
+    factual_results, factual_score = evaluate_factual_correctness(
+        llm, predictions, batched=batched_entailment, max_concurrency=max_concurrency, claim_store=claim_store
+    )
+    if claim_store is not None:
+        print(f"Claim store: {claim_store.stats()}")
     print_factual_evaluation(factual_results, factual_score)
     
     return predictions, {
@@ -341,16 +742,122 @@ def evaluate_rag_system(llm, retriever):
         }
     }
 
+def evaluate_rag_system_resumable(llm, retriever, results_store, qa_path=QA_PAIRS_PATH, answer_cache=None,
+                                  max_concurrency=None, batched_entailment=False, claim_store=None, tracer=None):
+    """
+    Evaluate the RAG system, writing each QA pair to a results store as soon as it is scored
+    
+    QA pairs whose question ID is already in the store are skipped, so an
+    interrupted run resumes where it stopped. Pairs are processed in small
+    windows and nothing is kept in memory after it is stored.
+    
+    Args:
+        llm: Chat model used for answers and claim checks
+        retriever: Retriever returning the context chunks
+        results_store: ResultsStore receiving one record per QA pair
+        qa_path: YAML file of QA pairs
+        answer_cache: Optional SemanticAnswerCache passed to answer_question
+        max_concurrency: Optional number of QA pairs evaluated at the same time
+        batched_entailment: Judge all claims of an answer in one structured-output call
+        claim_store: Optional ClaimStore of precomputed ground-truth claims
+        tracer: Optional Tracer timing the stages of every answer
+    
+    Returns:
+        dict: Summary of the stored run (see ResultsStore.summary)
+    """
+    with open(qa_path, "r") as file:
+        qa_pairs = yaml.safe_load(file)['qa_pairs']
+    
+    def evaluate_one(qa_pair):
+        prediction = answer_qa_pair(llm, retriever, qa_pair, answer_cache=answer_cache, tracer=tracer)
+        rouge_results, _ = evaluate_with_rouge([prediction])
+        result = score_factual_correctness(llm, rouge_results[0], batched=batched_entailment, claim_store=claim_store)
+        results_store.append(result)
+    
+    pending = (qa_pair for qa_pair in qa_pairs if not results_store.is_done(qa_pair['id']))
+    window_size = 4 * max_concurrency if max_concurrency else 1
+    skipped = len(results_store)
+    evaluated = 0
+    while True:
+        window = [qa_pair for _, qa_pair in zip(range(window_size), pending)]
+        if not window:
+            break
+        if max_concurrency:
+            run_concurrently(evaluate_one, window, max_concurrency=max_concurrency)
+        else:
+            evaluate_one(window[0])
+        evaluated += len(window)
+    print(f"Evaluated {evaluated} QA pairs, {skipped} were already stored")
+    if tracer is not None:
+        print_trace_summary(tracer.summary())
+    
+    summary = results_store.summary()
+    print_results_summary(summary, results_store.run_id)
+    return summary
+
 def main():
+    parser = argparse.ArgumentParser(description="Run and evaluate the RAG system")
+    parser.add_argument("--prepare-dataset", action="store_true",
+                        help="Only extract and store the claims of the ground-truth answers")
+    parser.add_argument("--results", help="SQLite file that results are streamed to; reruns resume from it")
+    parser.add_argument("--run-id", default="default", help="Name of the evaluation run in the results file")
+    parser.add_argument("--max-concurrency", type=int, default=8,
+                        help="QA pairs answered and scored at the same time; 1 runs the sequential loop")
+    parser.add_argument("--query-cache-size", type=int, default=None,
+                        help="Keep the embeddings and retrieved chunks of this many recent questions in memory")
+    parser.add_argument("--answer-cache", action="store_true",
+                        help="Serve answers to paraphrased questions from the semantic answer cache")
+    parser.add_argument("--batched-entailment", action="store_true",
+                        help="Judge all claims of a prediction in one structured-output call instead of one "
+                             "call per claim")
+    parser.add_argument("--compare-factual", action="store_true",
+                        help="Also score the predictions with both entailment paths and print calls, wall time "
+                             "and score of each")
+    parser.add_argument("--trace", help="Time the query path and write <TRACE>.json and <TRACE>.trace.json "
+                                        "(Chrome trace format)")
+    args = parser.parse_args()
+    if args.compare_factual and args.results:
+        parser.error("--compare-factual needs the predictions in memory and cannot be combined with --results")
+    claim_store = ClaimStore()
+    max_concurrency = args.max_concurrency if args.max_concurrency > 1 else None
+    
+    if args.prepare_dataset:
+        prepare_dataset(ChatOpenAI(model="gpt-4o-mini", temperature=0), claim_store)
+        return
+    
     # Initialize the RAG system
     file_path = "/Users/jayantkapoor/Documents/GitHub/w25-llm-tutorials/rag/data/story_1.txt"
-    llm, retriever = create_rag_system(file_path)
+    embedding_cache_path = os.path.join(DEFAULT_CACHE_DIR, "embeddings.sqlite")
+    tracer = Tracer() if args.trace else None
+    answer_cache_path = os.path.join(DEFAULT_CACHE_DIR, "answers.sqlite") if args.answer_cache else None
+    rag_system = create_rag_system(
+        file_path, embedding_cache_path=embedding_cache_path, query_cache_size=args.query_cache_size, tracer=tracer,
+        answer_cache_path=answer_cache_path
+    )
+    llm, retriever = rag_system[:2]
+    answer_cache = rag_system[2] if answer_cache_path else None
     
     # Run evaluation
-    predictions, evaluation_results = evaluate_rag_system(llm, retriever)
-    
-    # Access specific evaluation results if needed
-    rouge_results = evaluation_results['rouge']
+    if args.results:
+        evaluate_rag_system_resumable(
+            llm, retriever, ResultsStore(args.results, run_id=args.run_id), answer_cache=answer_cache,
+            max_concurrency=max_concurrency, batched_entailment=args.batched_entailment, claim_store=claim_store,
+            tracer=tracer
+        )
+    else:
+        predictions, evaluation_results = evaluate_rag_system(
+            llm, retriever, answer_cache=answer_cache, max_concurrency=max_concurrency,
+            batched_entailment=args.batched_entailment, claim_store=claim_store, tracer=tracer
+        )
+        if args.compare_factual:
+            compare_factual_evaluation(llm, predictions, max_concurrency=max_concurrency, claim_store=claim_store)
+        
+        # Access specific evaluation results if needed
+        rouge_results = evaluation_results['rouge']
+    if tracer is not None:
+        tracer.export_json(f"{args.trace}.json")
+        tracer.export_chrome_trace(f"{args.trace}.trace.json")
+        print(f"Timing spans written to {args.trace}.json and {args.trace}.trace.json")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,159 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.embeddings import Embeddings
+
+from fake_embeddings import FakeEmbeddings
+from tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+
+class BatchedEmbeddings(Embeddings):
+    """
+    Split embedding work into batches and send several batches concurrently
+
+    Texts are packed into requests of at most batch_size texts and at most
+    max_tokens_per_batch tokens, up to max_in_flight requests run at the same
+    time, and a failed request is retried on its own without resending the
+    batches that already succeeded.
+
+    Args:
+        embeddings: The embeddings backend (e.g. OpenAIEmbeddings or FakeEmbeddings)
+        batch_size: Maximum number of texts per request
+        max_in_flight: Maximum number of concurrent requests
+        max_tokens_per_batch: Maximum number of tokens per request
+        max_retries: Number of retries for a failed batch
+        retry_backoff: Initial wait before a retry in seconds, doubled on every attempt
+    """
+
+    def __init__(self, embeddings, batch_size=256, max_in_flight=4, max_tokens_per_batch=100_000,
+                 max_retries=3, retry_backoff=1.0):
+        self.embeddings = embeddings
+        self.batch_size = batch_size
+        self.max_in_flight = max_in_flight
+        self.max_tokens_per_batch = max_tokens_per_batch
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.retries = 0
+
+    @property
+    def model(self):
+        return getattr(self.embeddings, "model", None)
+
+    @property
+    def dimensions(self):
+        return getattr(self.embeddings, "dimensions", None)
+
+    def make_batches(self, texts):
+        """
+        Pack texts into batches under the size and token limits
+
+        Returns:
+            list: Lists of indices into texts, one list per request
+        """
+        model = self.model or "text-embedding-3-large"
+        batches = []
+        current, current_tokens = [], 0
+        for index, text in enumerate(texts):
+            tokens = count_tokens(text, model)
+            if current and (len(current) >= self.batch_size
+                            or current_tokens + tokens > self.max_tokens_per_batch):
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(index)
+            current_tokens += tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    def _embed_batch(self, texts):
+        """Embed one batch, retrying it alone if the request fails"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                with self._lock:
+                    self.requests += 1
+                return self.embeddings.embed_documents(texts)
+            except Exception as error:
+                if attempt == self.max_retries:
+                    raise
+                with self._lock:
+                    self.retries += 1
+                wait = self.retry_backoff * (2 ** attempt)
+                logger.warning("Embedding batch of %d texts failed (%s), retrying in %.1fs",
+                               len(texts), error, wait)
+                time.sleep(wait)
+
+    def embed_documents(self, texts):
+        """Embed texts in concurrent batches, returning vectors in input order"""
+        batches = self.make_batches(texts)
+        if not batches:
+            return []
+
+        vectors = [None] * len(texts)
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as executor:
+            futures = [
+                (batch, executor.submit(self._embed_batch, [texts[i] for i in batch]))
+                for batch in batches
+            ]
+            for batch, future in futures:
+                for index, vector in zip(batch, future.result()):
+                    vectors[index] = vector
+        return vectors
+
+    def embed_query(self, text):
+        return self.embeddings.embed_query(text)
+
+    def embed_queries(self, texts):
+        """Embed many questions with batched requests instead of one request each"""
+        return self.embed_documents(texts)
+
+    def stats(self):
+        return {'requests': self.requests, 'retries': self.retries}
+
+
+def benchmark_throughput(num_texts=2000, batch_sizes=(16, 64, 256), concurrency_levels=(1, 4, 8),
+                         latency_seconds=0.05, failure_rate=0.0):
+    """
+    Measure embedding throughput against the local fake backend
+
+    Returns:
+        list: One result dictionary per (batch_size, max_in_flight) combination
+    """
+    texts = [f"Chunk number {i} of the story about the kingdom of Luminara." for i in range(num_texts)]
+    results = []
+    for batch_size in batch_sizes:
+        for max_in_flight in concurrency_levels:
+            backend = FakeEmbeddings(size=256, latency_seconds=latency_seconds,
+                                     seconds_per_text=0.0001, failure_rate=failure_rate)
+            embeddings = BatchedEmbeddings(backend, batch_size=batch_size, max_in_flight=max_in_flight,
+                                           retry_backoff=0.01)
+            start = time.perf_counter()
+            embeddings.embed_documents(texts)
+            seconds = time.perf_counter() - start
+            results.append({
+                'batch_size': batch_size,
+                'max_in_flight': max_in_flight,
+                'seconds': seconds,
+                'texts_per_second': num_texts / seconds,
+                'requests': embeddings.requests,
+                'retries': embeddings.retries,
+            })
+    return results
+
+
+def main():
+    print("\n=== Embedding Throughput (fake backend) ===")
+    for result in benchmark_throughput(failure_rate=0.05):
+        print(f"batch_size={result['batch_size']:<4} max_in_flight={result['max_in_flight']:<2} "
+              f"{result['texts_per_second']:>9.1f} texts/s  "
+              f"requests={result['requests']:<4} retries={result['retries']}")
+
+
+if __name__ == "__main__":
+    main()
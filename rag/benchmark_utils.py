@@ -0,0 +1,79 @@
+import os
+
+import numpy as np
+import yaml
+from dotenv import load_dotenv
+from langchain_community.document_loaders import TextLoader
+from langchain_openai import OpenAIEmbeddings
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from embedding_cache import CachedEmbeddings, DEFAULT_CACHE_DIR
+from fake_embeddings import FakeEmbeddings
+
+# Paths relative to this script, so benchmarks run from any checkout
+RAG_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(RAG_DIR, "data")
+STORY_PATH = os.path.join(DATA_DIR, "story_1.txt")
+QA_PATHS = [os.path.join(DATA_DIR, "qa_pairs.yaml"), os.path.join(DATA_DIR, "qa_pairs_test.yaml")]
+
+
+def load_qa_pairs(paths=None):
+    """Load the QA pairs of one or more YAML files into a single list"""
+    qa_pairs = []
+    for path in paths or QA_PATHS:
+        with open(path, "r") as file:
+            qa_pairs.extend(yaml.safe_load(file)['qa_pairs'])
+    return qa_pairs
+
+
+def load_splits(file_path=STORY_PATH, chunk_size=1000, chunk_overlap=200):
+    """Load and split a text file the same way create_rag_system does"""
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size, chunk_overlap=chunk_overlap, add_start_index=True
+    )
+    return text_splitter.split_documents(TextLoader(file_path).load())
+
+
+def make_benchmark_embeddings(fake=False, dimensions=None):
+    """
+    Create the embeddings model used by benchmarks
+
+    Real embeddings go through the on-disk cache (queries included), so
+    repeated benchmark runs do not pay for the same vectors twice. The fake
+    backend runs offline.
+    """
+    if fake:
+        return FakeEmbeddings(size=dimensions or 3072)
+    load_dotenv(os.path.join(os.path.dirname(RAG_DIR), ".env"))
+    if dimensions:
+        embeddings = OpenAIEmbeddings(model="text-embedding-3-large", dimensions=dimensions)
+    else:
+        embeddings = OpenAIEmbeddings(model="text-embedding-3-large")
+    return CachedEmbeddings(
+        embeddings,
+        path=os.path.join(DEFAULT_CACHE_DIR, "embeddings.sqlite"),
+        cache_queries=True
+    )
+
+
+def recall_at_k(found, expected):
+    """Fraction of the expected items that were found"""
+    expected = set(expected)
+    if not expected:
+        return 1.0
+    return len(expected & set(found)) / len(expected)
+
+
+def latency_summary(seconds):
+    """Mean and percentiles of a list of durations, in milliseconds"""
+    if not seconds:
+        return {'mean_ms': 0.0, 'p50_ms': 0.0, 'p95_ms': 0.0, 'p99_ms': 0.0, 'max_ms': 0.0}
+    milliseconds = np.asarray(seconds, dtype=np.float64) * 1000
+    p50, p95, p99 = np.percentile(milliseconds, [50, 95, 99])
+    return {
+        'mean_ms': float(milliseconds.mean()),
+        'p50_ms': float(p50),
+        'p95_ms': float(p95),
+        'p99_ms': float(p99),
+        'max_ms': float(milliseconds.max()),
+    }
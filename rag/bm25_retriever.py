@@ -0,0 +1,234 @@
+import re
+import threading
+from collections import Counter
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from numpy_vector_store import top_k
+from query_cache import index_version
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+# Very common English words, dropped so their long postings lists are never scanned
+STOPWORDS = frozenset("""
+a an and are as at be but by did do does for from had has have he her his how i if in into is it its
+of on or she that the their them then there they this to was were what when where which who whom why
+will with you your
+""".split())
+
+
+def tokenize(text):
+    """Lowercase word tokens without stopwords"""
+    return [token for token in _TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def document_key(doc):
+    """Identity of a chunk, used to match results of different retrievers"""
+    return doc.id or doc.page_content
+
+
+def iter_store_documents(vector_store):
+    """Yield every document held by a vector store (NumPy-backed stores or Chroma)"""
+    documents = getattr(vector_store, "_documents", None)
+    if documents is not None:
+        for row in range(len(documents)):
+            yield documents[row]
+        return
+
+    contents = vector_store.get(include=["documents", "metadatas"])
+    for doc_id, text, metadata in zip(contents['ids'], contents['documents'], contents['metadatas']):
+        yield Document(id=doc_id, page_content=text, metadata=metadata or {})
+
+
+class BM25Index:
+    """
+    In-process inverted index with Okapi BM25 scoring
+
+    Every term maps to a postings list of document rows and precomputed BM25
+    weights, so a query only touches the postings of its own terms: scoring
+    is a concatenation plus a grouped sum, independent of corpus size for
+    rare terms like proper nouns.
+
+    An index built with from_vector_store() follows its store: when the
+    store's index_version() changed since the last search, the chunks are
+    read again and the postings rebuilt, e.g. after incremental re-ingestion.
+
+    Args:
+        k1: Term frequency saturation
+        b: Document length normalization
+    """
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.documents = []
+        self._term_counts = []
+        self._postings = {}
+        self._dirty = False
+        # Incremented on every change, so caches can tell when results are stale
+        self.version = 0
+        # Vector store the index mirrors, and its version when it was last read
+        self.source = None
+        self._source_version = None
+        self._refresh_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.documents)
+
+    def add_documents(self, documents):
+        for doc in documents:
+            self.documents.append(doc)
+            self._term_counts.append(Counter(tokenize(doc.page_content)))
+        self._dirty = True
+        self.version += 1
+
+    def refresh(self):
+        """Re-read the source vector store if it changed since it was last read"""
+        if self.source is None or index_version(self.source) == self._source_version:
+            return
+        with self._refresh_lock:
+            source_version = index_version(self.source)
+            if source_version == self._source_version:
+                return
+            self.documents = []
+            self._term_counts = []
+            self.add_documents(iter_store_documents(self.source))
+            self._build()
+            self._source_version = source_version
+
+    def _build(self):
+        """Turn the per-document term counts into postings arrays of BM25 weights"""
+        lengths = np.array([sum(counts.values()) for counts in self._term_counts], dtype=np.float32)
+        average_length = float(lengths.mean()) if len(lengths) and lengths.mean() > 0 else 1.0
+        length_norm = self.k1 * (1 - self.b + self.b * lengths / average_length)
+
+        # Flatten to (term id, row, count) triples and group them by term with one sort
+        term_ids = {}
+        flat_terms, flat_counts = [], []
+        row_lengths = np.empty(len(self._term_counts), dtype=np.int64)
+        for row, counts in enumerate(self._term_counts):
+            flat_terms.extend(term_ids.setdefault(term, len(term_ids)) for term in counts)
+            flat_counts.extend(counts.values())
+            row_lengths[row] = len(counts)
+        terms = np.array(flat_terms, dtype=np.int64)
+        rows = np.repeat(np.arange(len(row_lengths), dtype=np.int32), row_lengths)
+        counts = np.array(flat_counts, dtype=np.float32)
+
+        order = np.argsort(terms, kind="stable")
+        terms, rows, counts = terms[order], rows[order], counts[order]
+        document_frequency = np.bincount(terms, minlength=len(term_ids))
+        idf = np.log(1 + (len(self.documents) - document_frequency + 0.5) / (document_frequency + 0.5))
+        weights = (idf[terms] * counts * (self.k1 + 1) / (counts + length_norm[rows])).astype(np.float32)
+
+        bounds = np.concatenate(([0], np.cumsum(document_frequency)))
+        self._postings = {
+            term: (rows[bounds[i]:bounds[i + 1]], weights[bounds[i]:bounds[i + 1]])
+            for term, i in term_ids.items()
+        }
+        self._dirty = False
+
+    def search(self, query, k=4):
+        """
+        Return the k best (document, score) pairs for a query
+
+        Documents that share no term with the query are never returned.
+        """
+        self.refresh()
+        if self._dirty:
+            self._build()
+        postings = [self._postings[term] for term in set(tokenize(query)) if term in self._postings]
+        if not postings:
+            return []
+        rows = np.concatenate([p[0] for p in postings])
+        weights = np.concatenate([p[1] for p in postings])
+        # Sum the weights per document over the query terms
+        unique_rows, inverse = np.unique(rows, return_inverse=True)
+        scores = np.bincount(inverse, weights=weights)
+        best, best_scores = top_k(scores[None, :], k)
+        return [(self.documents[unique_rows[i]], float(score)) for i, score in zip(best[0], best_scores[0])]
+
+    def batch_search(self, queries, k=4):
+        return [self.search(query, k) for query in queries]
+
+    @classmethod
+    def from_vector_store(cls, vector_store, **kwargs):
+        """Build a lexical index over the chunks in a vector store, kept in sync with it"""
+        index = cls(**kwargs)
+        index.source = vector_store
+        index.refresh()
+        return index
+
+
+class BM25Retriever(BaseRetriever):
+    """Lexical retriever over a BM25Index"""
+
+    index: BM25Index
+    k: int = 2
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        return [doc for doc, _ in self.index.search(query, self.k)]
+
+    def batch(self, inputs, config=None, *, return_exceptions=False, **kwargs):
+        return [[doc for doc, _ in results] for results in self.index.batch_search(inputs, self.k)]
+
+
+def reciprocal_rank_fusion(result_lists, k, rrf_k=60, weights=None):
+    """
+    Merge ranked document lists with reciprocal rank fusion
+
+    Each document scores sum(weight / (rrf_k + rank)) over the lists it
+    appears in, so it is robust to the very different score scales of BM25
+    and cosine similarity.
+    """
+    weights = weights or [1.0] * len(result_lists)
+    scores, documents = {}, {}
+    for weight, results in zip(weights, result_lists):
+        for rank, doc in enumerate(results, 1):
+            key = document_key(doc)
+            documents.setdefault(key, doc)
+            scores[key] = scores.get(key, 0.0) + weight / (rrf_k + rank)
+    ranked = sorted(scores, key=scores.get, reverse=True)[:k]
+    return [documents[key] for key in ranked]
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Fuse dense vector search with BM25 lexical search
+
+    Both retrievers return candidate_k candidates, which are merged with
+    reciprocal rank fusion into the final k. Rare proper nouns that dense
+    search misses are picked up lexically without raising k.
+    """
+
+    vector_store: object
+    index: BM25Index
+    k: int = 2
+    candidate_k: int = 10
+    rrf_k: int = 60
+    dense_weight: float = 1.0
+    lexical_weight: float = 1.0
+
+    def _fuse(self, dense, lexical):
+        return reciprocal_rank_fusion(
+            [dense, lexical], self.k, rrf_k=self.rrf_k, weights=[self.dense_weight, self.lexical_weight]
+        )
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        dense = self.vector_store.similarity_search(query, k=self.candidate_k)
+        lexical = [doc for doc, _ in self.index.search(query, self.candidate_k)]
+        return self._fuse(dense, lexical)
+
+    def batch(self, inputs, config=None, *, return_exceptions=False, **kwargs):
+        inputs = list(inputs)
+        batch_search = getattr(self.vector_store, "batch_similarity_search_with_score", None)
+        if batch_search is None:
+            return super().batch(inputs, config, return_exceptions=return_exceptions, **kwargs)
+        # One embedding request and one matrix product for all dense searches
+        dense_results = batch_search(inputs, k=self.candidate_k)
+        lexical_results = self.index.batch_search(inputs, self.candidate_k)
+        return [
+            self._fuse([doc for doc, _ in dense], [doc for doc, _ in lexical])
+            for dense, lexical in zip(dense_results, lexical_results)
+        ]
@@ -0,0 +1,224 @@
+import argparse
+import json
+import os
+import random
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+from nltk.stem import porter
+from rouge_score import rouge_scorer, scoring, tokenize
+
+from benchmark_utils import load_qa_pairs
+from cache_keys import text_hash
+
+ROUGE_TYPES = ('rouge1', 'rouge2', 'rougeL')
+
+
+class CachingStemmer:
+    """Porter stemmer that remembers every word it has stemmed"""
+
+    def __init__(self):
+        self.stem = lru_cache(maxsize=None)(porter.PorterStemmer().stem)
+
+
+# One stemmer per process, reused by every chunk the process scores
+_STEMMER = CachingStemmer()
+
+
+def tokenize_text(text):
+    """Tokenize and stem exactly like RougeScorer(use_stemmer=True)"""
+    return tokenize.tokenize(text, _STEMMER)
+
+
+def ngram_counts(tokens, n):
+    return Counter(tuple(tokens[i:i + n]) for i in range(len(tokens) - n + 1))
+
+
+def prepare_reference(tokens):
+    """Everything about a reference that does not depend on the prediction"""
+    # Bit i of masks[token] is set when tokens[i] == token, for bit-parallel LCS
+    masks = {}
+    for position, token in enumerate(tokens):
+        masks[token] = masks.get(token, 0) | (1 << position)
+    return {
+        'length': len(tokens),
+        'ngrams': {1: ngram_counts(tokens, 1), 2: ngram_counts(tokens, 2)},
+        'masks': masks,
+    }
+
+
+def lcs_length(masks, length, tokens):
+    """
+    Length of the longest common subsequence of a reference and tokens
+
+    Bit-parallel algorithm of Crochemore et al. (2001): one addition and a
+    few bitwise operations on a length-bit integer per prediction token,
+    instead of a row of the dynamic-programming table.
+    """
+    full = (1 << length) - 1
+    row = full
+    for token in tokens:
+        match = masks.get(token)
+        if match:
+            matched = row & match
+            row = ((row + matched) | (row - matched)) & full
+    return length - bin(row).count("1")
+
+
+def _fmeasure_score(overlap, prediction_count, reference_count):
+    precision = overlap / prediction_count
+    recall = overlap / reference_count
+    return scoring.fmeasure(precision, recall)
+
+
+def score_prepared(reference, prediction_tokens):
+    """ROUGE-1/2/L f-measures, computed with the same arithmetic as rouge_score"""
+    scores = {}
+    for n in (1, 2):
+        reference_ngrams = reference['ngrams'][n]
+        prediction_ngrams = ngram_counts(prediction_tokens, n)
+        overlap = sum(min(count, prediction_ngrams[ngram]) for ngram, count in reference_ngrams.items())
+        scores[f"rouge{n}"] = _fmeasure_score(
+            overlap, max(sum(prediction_ngrams.values()), 1), max(sum(reference_ngrams.values()), 1)
+        )
+    if not reference['length'] or not prediction_tokens:
+        scores['rougeL'] = 0
+    else:
+        overlap = lcs_length(reference['masks'], reference['length'], prediction_tokens)
+        scores['rougeL'] = _fmeasure_score(overlap, len(prediction_tokens), reference['length'])
+    return scores
+
+
+def _score_chunk(chunk):
+    """Score (reference tokens, prediction text) pairs in a worker process"""
+    prepared = {}
+    results = []
+    for reference_tokens, prediction in chunk:
+        # Pairs sharing a reference share its token list, so identity is a cheap key
+        reference = prepared.get(id(reference_tokens))
+        if reference is None:
+            reference = prepared[id(reference_tokens)] = prepare_reference(reference_tokens)
+        results.append(score_prepared(reference, tokenize_text(prediction)))
+    return results
+
+
+def tokenize_references(references, cache_path=None):
+    """
+    Tokenize every distinct reference once, optionally through an on-disk cache
+
+    Returns:
+        dict: {reference text: tokens}
+    """
+    cached = {}
+    if cache_path and os.path.exists(cache_path):
+        with open(cache_path, "r") as file:
+            cached = json.load(file)
+
+    tokens, changed = {}, False
+    for text in dict.fromkeys(references):
+        key = text_hash(text)
+        if key not in cached:
+            cached[key] = tokenize_text(text)
+            changed = True
+        tokens[text] = cached[key]
+
+    if cache_path and changed:
+        os.makedirs(os.path.dirname(os.path.abspath(cache_path)), exist_ok=True)
+        with open(cache_path + ".tmp", "w") as file:
+            json.dump(cached, file)
+        os.replace(cache_path + ".tmp", cache_path)
+    return tokens
+
+
+def bulk_rouge_scores(references, predictions, max_workers=None, chunk_size=2000, reference_cache_path=None):
+    """
+    ROUGE-1, ROUGE-2 and ROUGE-L f-measures for many (reference, prediction) pairs
+
+    Results are identical to RougeScorer(['rouge1', 'rouge2', 'rougeL'],
+    use_stemmer=True).score(reference, prediction)[...].fmeasure. Speedups:
+    references are tokenized once per distinct text (and optionally cached
+    on disk across runs), stems are memoized per process, ROUGE-L uses a
+    bit-parallel LCS, and chunks of pairs are scored on a process pool.
+
+    Args:
+        references: Ground-truth texts
+        predictions: Predicted texts, same length as references
+        max_workers: Number of worker processes (None for one per CPU, 0 to run inline)
+        chunk_size: Number of pairs sent to a worker at once
+        reference_cache_path: Optional JSON file of tokenized references
+
+    Returns:
+        list: One {'rouge1', 'rouge2', 'rougeL'} dict per pair, in input order
+    """
+    references, predictions = list(references), list(predictions)
+    if len(references) != len(predictions):
+        raise ValueError(f"Got {len(references)} references but {len(predictions)} predictions")
+    reference_tokens = tokenize_references(references, reference_cache_path)
+    pairs = [(reference_tokens[reference], prediction) for reference, prediction in zip(references, predictions)]
+    chunks = [pairs[start:start + chunk_size] for start in range(0, len(pairs), chunk_size)]
+
+    if max_workers == 0 or len(chunks) <= 1:
+        chunk_results = map(_score_chunk, chunks)
+        return [scores for chunk in chunk_results for scores in chunk]
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return [scores for chunk in executor.map(_score_chunk, chunks) for scores in chunk]
+
+
+def make_regression_set(rows, seed=0):
+    """Synthetic (reference, prediction) pairs built from the QA answers"""
+    rng = random.Random(seed)
+    answers = [qa_pair['answer'] for qa_pair in load_qa_pairs()]
+    references, predictions = [], []
+    for _ in range(rows):
+        reference = rng.choice(answers)
+        words = reference.split() + rng.choice(answers).split()[:rng.randint(0, 10)]
+        rng.shuffle(words)
+        references.append(reference)
+        predictions.append(" ".join(words[:rng.randint(1, len(words))]))
+    return references, predictions
+
+
+def benchmark_bulk_rouge(rows=20000, max_workers=None):
+    """Time the RougeScorer loop and the bulk path on the same pairs and check they agree"""
+    references, predictions = make_regression_set(rows)
+
+    start = time.perf_counter()
+    scorer = rouge_scorer.RougeScorer(list(ROUGE_TYPES), use_stemmer=True)
+    expected = []
+    for reference, prediction in zip(references, predictions):
+        scores = scorer.score(reference, prediction)
+        expected.append({rouge_type: scores[rouge_type].fmeasure for rouge_type in ROUGE_TYPES})
+    loop_seconds = time.perf_counter() - start
+
+    results = [{'path': "RougeScorer loop", 'seconds': loop_seconds, 'identical': True}]
+    for label, workers in (("bulk, inline", 0), ("bulk, process pool", max_workers)):
+        _STEMMER.stem.cache_clear()
+        start = time.perf_counter()
+        scores = bulk_rouge_scores(references, predictions, max_workers=workers)
+        results.append({
+            'path': label,
+            'seconds': time.perf_counter() - start,
+            'identical': scores == expected,
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark bulk ROUGE scoring against the RougeScorer loop")
+    parser.add_argument("--rows", type=int, default=20000, help="Number of (reference, prediction) pairs")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: one per CPU)")
+    args = parser.parse_args()
+
+    results = benchmark_bulk_rouge(args.rows, args.workers)
+    print("\n=== Bulk ROUGE vs RougeScorer Loop ===")
+    print(f"{args.rows} pairs")
+    baseline = results[0]['seconds']
+    for result in results:
+        print(f"{result['path']:<20} {result['seconds']:8.2f}s  {baseline / result['seconds']:5.1f}x  "
+              f"identical={result['identical']}")
+
+
+if __name__ == "__main__":
+    main()
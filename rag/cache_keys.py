@@ -0,0 +1,11 @@
+import hashlib
+
+
+def text_hash(text):
+    """SHA-256 hex digest of a text, used wherever content addresses a cache or an ID"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def llm_model_key(llm):
+    """Return a string identifying the chat model"""
+    return getattr(llm, "model_name", None) or getattr(llm, "model", None) or type(llm).__name__
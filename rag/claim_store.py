@@ -0,0 +1,97 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from cache_keys import llm_model_key, text_hash
+from embedding_cache import DEFAULT_CACHE_DIR
+
+
+class ClaimStore:
+    """
+    Persistent store of claims extracted from fixed texts
+
+    Claims are keyed by (hash of the text, model, prompt version), so the
+    ground-truth answers of a QA set are sent to the LLM once and every
+    later evaluation run reads their claims from disk. Changing the model or
+    bumping the prompt version makes the old entries unreachable.
+
+    Args:
+        path: Path of the SQLite file
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(DEFAULT_CACHE_DIR, "claims.sqlite")
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS claims ("
+            "text_hash TEXT NOT NULL, model TEXT NOT NULL, prompt_version TEXT NOT NULL, "
+            "claims TEXT NOT NULL, created REAL NOT NULL, "
+            "PRIMARY KEY (text_hash, model, prompt_version))"
+        )
+        self._conn.commit()
+
+    def get(self, text, model, prompt_version):
+        """Return the stored claims of a text, or None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT claims FROM claims WHERE text_hash = ? AND model = ? AND prompt_version = ?",
+                (text_hash(text), model, str(prompt_version))
+            ).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def put(self, text, model, prompt_version, claims):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO claims (text_hash, model, prompt_version, claims, created) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (text_hash(text), model, str(prompt_version), json.dumps(claims), time.time())
+            )
+            self._conn.commit()
+
+    def get_or_extract(self, llm, text, extract, prompt_version):
+        """
+        Return the claims of a text, extracting and storing them on a miss
+
+        Args:
+            llm: Chat model passed to extract
+            text: Text to extract claims from
+            extract: Function (llm, text) -> list of claims
+            prompt_version: Version of the extraction prompt
+
+        Returns:
+            tuple: (claims, whether they came from the store)
+        """
+        model = llm_model_key(llm)
+        claims = self.get(text, model, prompt_version)
+        if claims is not None:
+            self.hits += 1
+            return claims, True
+        self.misses += 1
+        claims = extract(llm, text)
+        self.put(text, model, prompt_version, claims)
+        return claims, False
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM claims").fetchone()[0]
+
+    def stats(self):
+        """Return store counters as a dictionary"""
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'entries': len(self),
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
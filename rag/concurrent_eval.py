@@ -0,0 +1,86 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class RateLimiter:
+    """
+    Spread call starts evenly so at most requests_per_second calls start per second
+
+    Args:
+        requests_per_second: Maximum start rate (None for no limit)
+    """
+
+    def __init__(self, requests_per_second=None):
+        self.interval = 1.0 / requests_per_second if requests_per_second else 0.0
+        self._next_start = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            wait = self._next_start - now
+            self._next_start = max(now, self._next_start) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+async def map_concurrently(fn, items, max_concurrency=8, requests_per_second=None):
+    """
+    Call a blocking function on every item with bounded concurrency
+
+    Calls run in a thread pool; a semaphore keeps at most max_concurrency
+    in flight and a rate limiter caps how fast new calls start. Results are
+    returned in the order of items, whatever order the calls finish in.
+
+    Returns:
+        tuple: (results, report) where the report compares the wall time with the
+        sum of per-call latencies. That sum only estimates a sequential loop: calls
+        that wait on each other (rate limits, shared locks, a busy API) take longer
+        when concurrent, so estimated_speedup is an upper bound, not a measurement.
+    """
+    items = list(items)
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(max_concurrency)
+    rate_limiter = RateLimiter(requests_per_second)
+    latencies = [0.0] * len(items)
+
+    async def run_one(index, item):
+        async with semaphore:
+            await rate_limiter.acquire()
+            start = time.perf_counter()
+            result = await loop.run_in_executor(executor, fn, item)
+            latencies[index] = time.perf_counter() - start
+            return result
+
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        results = await asyncio.gather(*(run_one(index, item) for index, item in enumerate(items)))
+    wall_seconds = time.perf_counter() - start_time
+
+    sequential_seconds = sum(latencies)
+    report = {
+        'items': len(items),
+        'max_concurrency': max_concurrency,
+        'requests_per_second': requests_per_second,
+        'wall_seconds': wall_seconds,
+        'sequential_estimate_seconds': sequential_seconds,
+        'estimated_speedup': sequential_seconds / wall_seconds if wall_seconds else 0.0,
+    }
+    return list(results), report
+
+
+def run_concurrently(fn, items, max_concurrency=8, requests_per_second=None):
+    """Synchronous entry point for map_concurrently()"""
+    return asyncio.run(map_concurrently(fn, items, max_concurrency, requests_per_second))
+
+
+def print_concurrency_report(report, label="Concurrent run"):
+    """Print wall time against the sequential estimate"""
+    print(f"\n=== {label} ===")
+    print(f"Items: {report['items']}, max concurrency: {report['max_concurrency']}, "
+          f"rate limit: {report['requests_per_second'] or 'none'} per second")
+    print(f"Wall time: {report['wall_seconds']:.2f}s, sequential estimate (sum of call latencies): "
+          f"{report['sequential_estimate_seconds']:.2f}s ({report['estimated_speedup']:.1f}x estimated speedup)")
@@ -0,0 +1,187 @@
+import logging
+
+from tokens import count_tokens, truncate_to_tokens
+
+logger = logging.getLogger(__name__)
+
+# Shortest shared text treated as a real overlap when chunk positions are unknown
+MIN_OVERLAP_CHARS = 20
+# Chunks this close in the source are joined into one passage
+MAX_GAP_CHARS = 2
+
+
+class _Passage:
+    """A contiguous span of one source document built from one or more chunks"""
+
+    def __init__(self, doc, rank):
+        self.source = doc.metadata.get('source')
+        self.start = doc.metadata.get('start_index')
+        self.text = doc.page_content
+        self.rank = rank
+        self.chunks = 1
+
+    @property
+    def end(self):
+        return None if self.start is None else self.start + len(self.text)
+
+
+def text_overlap(left, right, min_overlap=MIN_OVERLAP_CHARS):
+    """Length of the longest suffix of left that is a prefix of right (0 if shorter than min_overlap)"""
+    if min(len(left), len(right)) < min_overlap:
+        return 0
+    probe = right[:min_overlap]
+    position = left.find(probe, max(0, len(left) - len(right)))
+    while position != -1:
+        if right.startswith(left[position:]):
+            return len(left) - position
+        position = left.find(probe, position + 1)
+    return 0
+
+
+def _merge(left, right):
+    """Merge right into left if they overlap or touch, returning whether they were merged"""
+    if right.text in left.text:
+        merged_text = left.text
+    elif left.end is not None and right.start is not None and right.start - left.end <= MAX_GAP_CHARS:
+        overlap = left.end - right.start
+        if overlap > 0 and left.text.endswith(right.text[:overlap]):
+            merged_text = left.text + right.text[overlap:]
+        elif overlap <= 0:
+            merged_text = left.text + "\n" + right.text
+        else:
+            # Positions disagree with the text (e.g. stale metadata), trust the text
+            overlap = text_overlap(left.text, right.text)
+            if not overlap:
+                return False
+            merged_text = left.text + right.text[overlap:]
+    else:
+        overlap = text_overlap(left.text, right.text)
+        if not overlap:
+            return False
+        merged_text = left.text + right.text[overlap:]
+
+    if left.start is not None and right.start is not None:
+        left.start = min(left.start, right.start)
+    left.text = merged_text
+    left.rank = min(left.rank, right.rank)
+    left.chunks += right.chunks
+    return True
+
+
+def merge_chunks(docs):
+    """
+    Merge retrieved chunks into passages without repeated text
+
+    Chunks of the same source are sorted by their start_index metadata and
+    joined when they overlap or touch, the shared text kept once. When
+    positions are missing the overlap is found by matching the end of one
+    chunk with the start of another.
+
+    Returns:
+        list: Passages, each with the best retrieval rank of its chunks
+    """
+    by_source = {}
+    for rank, doc in enumerate(docs):
+        by_source.setdefault(doc.metadata.get('source'), []).append(_Passage(doc, rank))
+
+    passages = []
+    for pieces in by_source.values():
+        if all(piece.start is not None for piece in pieces):
+            pieces.sort(key=lambda piece: piece.start)
+            merged = [pieces[0]]
+            for piece in pieces[1:]:
+                if not _merge(merged[-1], piece):
+                    merged.append(piece)
+        else:
+            # Without positions, keep merging any ordered pair that overlaps
+            merged = list(pieces)
+            changed = True
+            while changed:
+                changed = False
+                for left in merged:
+                    for right in merged:
+                        if left is not right and _merge(left, right):
+                            merged.remove(right)
+                            changed = True
+                            break
+                    if changed:
+                        break
+        passages.extend(merged)
+    return passages
+
+
+def assemble_context(docs, max_tokens=None, model="gpt-4o-mini", separator="\n\n"):
+    """
+    Build the LLM context from retrieved chunks
+
+    Overlapping and adjacent chunks of the same source are merged, so the
+    text shared by neighbouring chunks (up to the splitter's chunk_overlap)
+    is sent once. Passages are kept in order of relevance until max_tokens
+    is reached, then ordered by source and position so the model reads
+    them in document order.
+
+    Args:
+        docs: Retrieved documents, most relevant first
+        max_tokens: Optional token budget for the context
+        model: Model whose tokenizer is used for counting
+        separator: Text placed between passages
+
+    Returns:
+        tuple: (context, report) where the report compares the token count with
+        the plain join of all chunks
+    """
+    passages = sorted(merge_chunks(docs), key=lambda passage: passage.rank)
+    separator_tokens = count_tokens(separator, model)
+
+    selected, used, truncated = [], 0, False
+    for passage in passages:
+        tokens = count_tokens(passage.text, model)
+        cost = tokens + (separator_tokens if selected else 0)
+        if max_tokens is not None and used + cost > max_tokens:
+            if not selected:
+                # Keep the start of the most relevant passage rather than sending nothing
+                passage.text = truncate_to_tokens(passage.text, max_tokens, model)
+                selected.append(passage)
+                used = count_tokens(passage.text, model)
+                truncated = True
+            continue
+        selected.append(passage)
+        used += cost
+
+    # Sources in order of their best passage, passages in document order within a source
+    source_rank = {}
+    for passage in selected:
+        source_rank[passage.source] = min(source_rank.get(passage.source, passage.rank), passage.rank)
+    selected.sort(key=lambda p: (source_rank[p.source], p.start if p.start is not None else -1, p.rank))
+    context = separator.join(passage.text for passage in selected)
+
+    baseline_tokens = count_tokens(separator.join(doc.page_content for doc in docs), model)
+    context_tokens = count_tokens(context, model)
+    report = {
+        'chunks': len(docs),
+        'passages': len(selected),
+        'dropped_passages': len(passages) - len(selected),
+        'truncated': truncated,
+        'baseline_tokens': baseline_tokens,
+        'context_tokens': context_tokens,
+        'tokens_saved': baseline_tokens - context_tokens,
+    }
+    logger.info("Context: %d chunks -> %d passages, %d -> %d tokens (%d saved)",
+                report['chunks'], report['passages'], baseline_tokens, context_tokens, report['tokens_saved'])
+    return context, report
+
+
+def summarize_context_reports(reports):
+    """Totals of the assemble_context() reports of many queries (None entries are skipped)"""
+    reports = [report for report in reports if report is not None]
+    baseline_tokens = sum(report['baseline_tokens'] for report in reports)
+    tokens_saved = sum(report['tokens_saved'] for report in reports)
+    return {
+        'queries': len(reports),
+        'baseline_tokens': baseline_tokens,
+        'context_tokens': sum(report['context_tokens'] for report in reports),
+        'tokens_saved': tokens_saved,
+        'mean_tokens_saved': tokens_saved / len(reports) if reports else 0.0,
+        'saved_fraction': tokens_saved / baseline_tokens if baseline_tokens else 0.0,
+        'truncated': sum(1 for report in reports if report['truncated']),
+    }
@@ -0,0 +1,137 @@
+import glob
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from langchain_community.document_loaders import TextLoader
+
+
+def is_corpus_path(path):
+    """Return True if the path names a directory or a glob pattern rather than one file"""
+    return os.path.isdir(path) or glob.has_magic(path)
+
+
+def find_corpus_files(path, pattern="*.txt"):
+    """
+    Resolve a file, directory or glob pattern into a sorted list of files
+
+    Args:
+        path: A single file, a directory (searched recursively) or a glob pattern
+        pattern: File name pattern used when path is a directory
+
+    Returns:
+        list: Paths of the matching files
+    """
+    if os.path.isdir(path):
+        matches = glob.glob(os.path.join(path, "**", pattern), recursive=True)
+    elif glob.has_magic(path):
+        matches = glob.glob(path, recursive=True)
+    else:
+        matches = [path]
+    return sorted(match for match in matches if os.path.isfile(match))
+
+
+def load_and_split_file(path, text_splitter):
+    """
+    Load one text file and split it into chunks
+
+    Runs inside worker processes, so it must stay a module-level function.
+    Every chunk keeps the source path and its position within the file.
+    """
+    documents = TextLoader(path).load()
+    splits = text_splitter.split_documents(documents)
+    for index, split in enumerate(splits):
+        split.metadata['source'] = path
+        split.metadata['chunk_index'] = index
+    return splits
+
+
+def iter_corpus_splits(file_paths, text_splitter, max_workers=None):
+    """
+    Load and split files over a process pool, yielding (path, splits) in input order
+
+    Only a bounded number of files is in flight at a time, so the results of
+    thousands of files never pile up in memory waiting for the consumer.
+
+    Args:
+        file_paths: Paths of the files to load
+        text_splitter: Splitter used to chunk each file (pickled to the workers)
+        max_workers: Number of worker processes (None for one per CPU, 0 to run inline)
+    """
+    if max_workers == 0:
+        for path in file_paths:
+            yield path, load_and_split_file(path, text_splitter)
+        return
+
+    max_workers = max_workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        window = 4 * max_workers
+        pending = deque()
+        paths = iter(file_paths)
+
+        for path in paths:
+            pending.append((path, executor.submit(load_and_split_file, path, text_splitter)))
+            if len(pending) >= window:
+                break
+
+        while pending:
+            path, future = pending.popleft()
+            splits = future.result()
+            # Refill the window before handing results to the consumer
+            next_path = next(paths, None)
+            if next_path is not None:
+                pending.append((next_path, executor.submit(load_and_split_file, next_path, text_splitter)))
+            yield path, splits
+
+
+def ingest_corpus(vector_store, path, text_splitter, max_workers=None, batch_size=256, pattern="*.txt",
+                  dedup=None):
+    """
+    Ingest a directory or glob of text files into a vector store
+
+    Loading and splitting is fanned out over a process pool, and the splits
+    are streamed into the vector store in batches of batch_size chunks.
+
+    Args:
+        vector_store: The vector store to populate
+        path: A directory, glob pattern or single file
+        text_splitter: Splitter used to chunk each file
+        max_workers: Number of worker processes (None for one per CPU, 0 to run inline)
+        batch_size: Number of chunks sent to add_documents at once
+        pattern: File name pattern used when path is a directory
+        dedup: Optional NearDuplicateFilter applied to the splits before they are added
+
+    Returns:
+        dict: Number of files, chunks and batches ingested and the time taken
+    """
+    start_time = time.perf_counter()
+    file_paths = find_corpus_files(path, pattern)
+    stats = {'files': 0, 'chunks': 0, 'batches': 0}
+
+    batch = []
+    for _, splits in iter_corpus_splits(file_paths, text_splitter, max_workers):
+        stats['files'] += 1
+        if dedup is not None:
+            splits = dedup.filter(splits)
+        batch.extend(splits)
+        while len(batch) >= batch_size:
+            vector_store.add_documents(documents=batch[:batch_size])
+            stats['chunks'] += batch_size
+            stats['batches'] += 1
+            batch = batch[batch_size:]
+    if batch:
+        vector_store.add_documents(documents=batch)
+        stats['chunks'] += len(batch)
+        stats['batches'] += 1
+
+    stats['seconds'] = time.perf_counter() - start_time
+    return stats
+
+
+def print_corpus_report(stats):
+    """Print corpus ingestion statistics"""
+    print("\n=== Corpus Ingest Report ===")
+    print(f"Files ingested: {stats['files']}")
+    print(f"Chunks ingested: {stats['chunks']} in {stats['batches']} batches")
+    print(f"Time taken: {stats['seconds']:.2f}s")
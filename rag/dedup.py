@@ -0,0 +1,158 @@
+import hashlib
+import math
+import re
+import zlib
+
+import numpy as np
+
+from tokens import count_tokens
+
+_WORD_PATTERN = re.compile(r"\w+")
+# Universal hashing h(x) = ((a * x + b) mod p) truncated to 32 bits, as in datasketch
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+
+def shingle_hashes(text, size=5):
+    """32-bit hashes of the distinct word n-grams of a text"""
+    words = _WORD_PATTERN.findall(text.lower())
+    if len(words) <= size:
+        shingles = {" ".join(words)}
+    else:
+        shingles = {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+    return np.fromiter((zlib.crc32(shingle.encode("utf-8")) for shingle in shingles), dtype=np.uint64)
+
+
+class MinHasher:
+    """
+    MinHash signatures: the fraction of equal entries of two signatures
+    estimates the Jaccard similarity of the two shingle sets
+
+    Args:
+        num_perm: Number of hash functions (signature length)
+        seed: Seed of the hash function parameters
+    """
+
+    def __init__(self, num_perm=128, seed=1):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self._a = rng.integers(1, int(_MERSENNE_PRIME), num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, int(_MERSENNE_PRIME), num_perm, dtype=np.uint64)
+
+    def signature(self, hashes):
+        """Signature of a set of shingle hashes, all hash functions applied at once"""
+        if len(hashes) == 0:
+            return np.full(self.num_perm, _MAX_HASH, dtype=np.uint32)
+        # Products wrap around at 2**64, which keeps the hashes well mixed
+        permuted = ((hashes[:, None] * self._a + self._b) % _MERSENNE_PRIME) & _MAX_HASH
+        return permuted.min(axis=0).astype(np.uint32)
+
+
+class NearDuplicateFilter:
+    """
+    Drop splits that repeat earlier splits before they are embedded
+
+    Exact repeats (after whitespace and case normalization) are caught by
+    a content hash. Near repeats are caught with MinHash signatures and LSH
+    banding: the signature is cut into bands, and only splits sharing at
+    least one band bucket are compared, so each split is checked against a
+    handful of candidates instead of every split seen so far. A candidate
+    whose estimated Jaccard similarity reaches threshold makes the split a
+    duplicate.
+
+    The filter keeps its state between calls, so duplicates are found
+    across files and batches of a whole ingestion run.
+
+    Args:
+        threshold: Minimum estimated Jaccard similarity of word shingles for a near duplicate
+        num_perm: MinHash signature length
+        bands: Number of LSH bands (num_perm must be a multiple of it)
+        shingle_size: Number of words per shingle
+    """
+
+    def __init__(self, threshold=0.8, num_perm=128, bands=32, shingle_size=5):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands})")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.hasher = MinHasher(num_perm)
+
+        self._exact = set()
+        self._signatures = []
+        self._buckets = [{} for _ in range(bands)]
+
+        self.splits_seen = 0
+        self.exact_duplicates = 0
+        self.near_duplicates = 0
+        self.tokens_avoided = 0
+
+    def is_duplicate(self, text):
+        """Check a text against everything kept so far, remembering it if it is new"""
+        self.splits_seen += 1
+        digest = hashlib.sha1(" ".join(text.split()).lower().encode("utf-8")).digest()
+        if digest in self._exact:
+            self.exact_duplicates += 1
+            return True
+
+        signature = self.hasher.signature(shingle_hashes(text, self.shingle_size))
+        band_keys = [signature[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+        candidates = set()
+        for buckets, key in zip(self._buckets, band_keys):
+            candidates.update(buckets.get(key, ()))
+        if candidates:
+            candidate_signatures = np.stack([self._signatures[i] for i in candidates])
+            similarity = (candidate_signatures == signature).mean(axis=1)
+            if similarity.max() >= self.threshold:
+                self.near_duplicates += 1
+                return True
+
+        self._exact.add(digest)
+        index = len(self._signatures)
+        self._signatures.append(signature)
+        for buckets, key in zip(self._buckets, band_keys):
+            buckets.setdefault(key, []).append(index)
+        return False
+
+    def filter(self, splits):
+        """Return the splits that are not (near) duplicates of earlier ones"""
+        kept = []
+        for split in splits:
+            if self.is_duplicate(split.page_content):
+                self.tokens_avoided += count_tokens(split.page_content)
+            else:
+                kept.append(split)
+        return kept
+
+    def report(self, embed_batch_size=256):
+        """
+        Summarize the filtering
+
+        Embedding requests avoided assume splits are sent in batches of
+        embed_batch_size.
+        """
+        duplicates = self.exact_duplicates + self.near_duplicates
+        kept = self.splits_seen - duplicates
+        return {
+            'splits': self.splits_seen,
+            'kept': kept,
+            'exact_duplicates': self.exact_duplicates,
+            'near_duplicates': self.near_duplicates,
+            'dedup_ratio': duplicates / self.splits_seen if self.splits_seen else 0.0,
+            'embedding_texts_avoided': duplicates,
+            'embedding_requests_avoided': (
+                math.ceil(self.splits_seen / embed_batch_size) - math.ceil(kept / embed_batch_size)
+            ),
+            'tokens_avoided': self.tokens_avoided,
+        }
+
+
+def print_dedup_report(report):
+    """Print near-duplicate filtering statistics"""
+    print("\n=== Dedup Report ===")
+    print(f"Splits: {report['splits']}, kept: {report['kept']}")
+    print(f"Duplicates dropped: {report['exact_duplicates']} exact, {report['near_duplicates']} near "
+          f"(dedup ratio {report['dedup_ratio']:.1%})")
+    print(f"Embedding calls avoided: {report['embedding_texts_avoided']} texts, "
+          f"{report['embedding_requests_avoided']} requests, {report['tokens_avoided']} tokens")
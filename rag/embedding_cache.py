@@ -0,0 +1,190 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+
+from langchain_core.embeddings import Embeddings
+
+# Default location for on-disk caches, next to this script
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")
+
+
+def embedding_model_key(embeddings):
+    """Return a string identifying the embedding model (and output size, if reduced)"""
+    model = getattr(embeddings, "model", None) or type(embeddings).__name__
+    dimensions = getattr(embeddings, "dimensions", None)
+    if dimensions:
+        return f"{model}:{dimensions}"
+    return str(model)
+
+
+def content_hash(model_key, text):
+    """Hash a (model, text) pair into a fixed-size cache key"""
+    return hashlib.sha256(f"{model_key}\0{text}".encode("utf-8")).hexdigest()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wrap an embeddings object with a persistent, content-addressed cache
+
+    Vectors are stored in a SQLite file keyed by a hash of (model name, text), so
+    unchanged chunks are served from disk and only new text is sent to the
+    underlying embeddings model. When the cache grows past max_entries, the
+    least recently used vectors are evicted.
+
+    Args:
+        embeddings: The embeddings object to wrap (e.g. OpenAIEmbeddings)
+        path: Path of the SQLite cache file
+        max_entries: Maximum number of vectors to keep on disk (None for no cap)
+        cache_queries: Whether embed_query results are cached as well
+    """
+
+    def __init__(self, embeddings, path=None, max_entries=100_000, cache_queries=False):
+        self.embeddings = embeddings
+        self.model_key = embedding_model_key(embeddings)
+        self.path = path or os.path.join(DEFAULT_CACHE_DIR, "embeddings.sqlite")
+        self.max_entries = max_entries
+        self.cache_queries = cache_queries
+
+        # Hit/miss counters, useful for sizing the cache
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS embeddings_last_access ON embeddings (last_access)"
+        )
+        self._conn.commit()
+
+    @property
+    def model(self):
+        """Model name of the wrapped embeddings, so caches can be stacked"""
+        return getattr(self.embeddings, "model", None)
+
+    @property
+    def dimensions(self):
+        return getattr(self.embeddings, "dimensions", None)
+
+    def _lookup(self, keys):
+        """Fetch cached vectors for the given keys, returning a {key: vector} dict"""
+        found = {}
+        unique_keys = list(dict.fromkeys(keys))
+        # SQLite limits the number of bound parameters, so query in slices
+        for start in range(0, len(unique_keys), 500):
+            batch = unique_keys[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows = self._conn.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+            ).fetchall()
+            for key, blob in rows:
+                vector = array("f")
+                vector.frombytes(blob)
+                found[key] = vector.tolist()
+        if found:
+            now = time.time()
+            self._conn.executemany(
+                "UPDATE embeddings SET last_access = ? WHERE key = ?",
+                [(now, key) for key in found]
+            )
+        return found
+
+    def _store(self, items):
+        """Write (key, vector) pairs to disk and evict old entries if over the cap"""
+        now = time.time()
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO embeddings (key, vector, last_access) VALUES (?, ?, ?)",
+            [(key, array("f", vector).tobytes(), now) for key, vector in items]
+        )
+        if self.max_entries is not None:
+            count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            overflow = count - self.max_entries
+            if overflow > 0:
+                # Evict the least recently used vectors
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN ("
+                    "SELECT key FROM embeddings ORDER BY last_access ASC LIMIT ?)",
+                    (overflow,)
+                )
+                self.evictions += overflow
+
+    def embed_documents(self, texts):
+        """Embed texts, only sending cache misses to the wrapped model"""
+        keys = [content_hash(self.model_key, text) for text in texts]
+
+        with self._lock:
+            cached = self._lookup(keys)
+            self._conn.commit()
+            num_misses = sum(1 for key in keys if key not in cached)
+            self.hits += len(texts) - num_misses
+            self.misses += num_misses
+
+        # Deduplicate misses so repeated chunks are only embedded once
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+
+        if missing:
+            new_vectors = self.embeddings.embed_documents(list(missing.values()))
+            new_items = list(zip(missing.keys(), new_vectors))
+            with self._lock:
+                self._store(new_items)
+                self._conn.commit()
+            cached.update(new_items)
+
+        return [list(cached[key]) for key in keys]
+
+    def embed_query(self, text):
+        """Embed a single query, going through the cache if cache_queries is set"""
+        if not self.cache_queries:
+            return self.embeddings.embed_query(text)
+
+        key = content_hash(self.model_key + ":query", text)
+        with self._lock:
+            cached = self._lookup([key])
+            self._conn.commit()
+            if key in cached:
+                self.hits += 1
+                return cached[key]
+            self.misses += 1
+
+        vector = self.embeddings.embed_query(text)
+        with self._lock:
+            self._store([(key, vector)])
+            self._conn.commit()
+        return vector
+
+    def embed_queries(self, texts):
+        """Embed several queries, batching them when the wrapped model supports it"""
+        embed_queries = getattr(self.embeddings, "embed_queries", None)
+        if embed_queries is not None and not self.cache_queries:
+            return embed_queries(texts)
+        return [self.embed_query(text) for text in texts]
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def stats(self):
+        """Return cache counters as a dictionary"""
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'evictions': self.evictions,
+            'entries': len(self),
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,71 @@
+import hashlib
+import re
+import threading
+import time
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+_WORD_PATTERN = re.compile(r"\w+")
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    Local stand-in for OpenAIEmbeddings, for throughput testing and offline benchmarks
+
+    Vectors are built by hashing every word to a fixed random direction and
+    summing them, so texts that share words get similar vectors and retrieval
+    results are still meaningful. Each call can simulate network latency and
+    random failures, and the number of requests is counted.
+
+    Args:
+        size: Dimension of the vectors (3072 matches text-embedding-3-large)
+        latency_seconds: Simulated round trip time per request
+        seconds_per_text: Additional simulated time per text in a request
+        failure_rate: Probability that a request raises an error
+        seed: Seed for the simulated failures
+    """
+
+    def __init__(self, size=3072, latency_seconds=0.0, seconds_per_text=0.0, failure_rate=0.0, seed=0):
+        self.size = size
+        self.model = f"fake-embedding-{size}"
+        self.latency_seconds = latency_seconds
+        self.seconds_per_text = seconds_per_text
+        self.failure_rate = failure_rate
+        self._rng = np.random.default_rng(seed)
+        self._word_vectors = {}
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.texts_embedded = 0
+
+    def _word_vector(self, word):
+        vector = self._word_vectors.get(word)
+        if vector is None:
+            seed = int.from_bytes(hashlib.sha256(word.encode("utf-8")).digest()[:8], "little")
+            vector = np.random.default_rng(seed).standard_normal(self.size).astype(np.float32)
+            self._word_vectors[word] = vector
+        return vector
+
+    def _embed(self, text):
+        words = _WORD_PATTERN.findall(text.lower())
+        if not words:
+            return np.zeros(self.size, dtype=np.float32).tolist()
+        vector = np.sum([self._word_vector(word) for word in words], axis=0)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def _simulate_request(self, num_texts):
+        with self._lock:
+            self.requests += 1
+            self.texts_embedded += num_texts
+            failed = self._rng.random() < self.failure_rate
+        time.sleep(self.latency_seconds + self.seconds_per_text * num_texts)
+        if failed:
+            raise RuntimeError("Simulated embedding request failure")
+
+    def embed_documents(self, texts):
+        self._simulate_request(len(texts))
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        self._simulate_request(1)
+        return self._embed(text)
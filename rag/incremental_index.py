@@ -0,0 +1,211 @@
+import hashlib
+import json
+import os
+
+from langchain_community.document_loaders import TextLoader
+
+from cache_keys import text_hash
+from query_cache import record_index_write
+
+MANIFEST_VERSION = 1
+
+
+def file_hash(path):
+    """Hash the raw bytes of a file, used to skip files that did not change"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def assign_chunk_ids(source, splits):
+    """
+    Give every split a stable ID derived from its source and content
+
+    IDs only depend on the chunk text (plus an occurrence counter for repeated
+    text), so editing one paragraph does not change the IDs of the other chunks.
+
+    Returns:
+        dict: {chunk_id: content_hash} in document order
+    """
+    chunks = {}
+    occurrences = {}
+    for split in splits:
+        content = text_hash(split.page_content)
+        occurrence = occurrences.get(content, 0)
+        occurrences[content] = occurrence + 1
+        chunk_id = text_hash(f"{source}\0{content}\0{occurrence}")[:32]
+        split.metadata['chunk_id'] = chunk_id
+        chunks[chunk_id] = content
+    return chunks
+
+
+def load_manifest(manifest_path):
+    """Load the ingest manifest, or return an empty one if none exists yet"""
+    if not os.path.exists(manifest_path):
+        return {'version': MANIFEST_VERSION, 'sources': {}}
+    with open(manifest_path, "r") as file:
+        manifest = json.load(file)
+    if manifest.get('version') != MANIFEST_VERSION:
+        raise ValueError(f"Unsupported manifest version in {manifest_path}: {manifest.get('version')}")
+    return manifest
+
+
+def save_manifest(manifest_path, manifest):
+    """Write the manifest atomically so a crash never leaves a half-written file"""
+    os.makedirs(os.path.dirname(os.path.abspath(manifest_path)), exist_ok=True)
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w") as file:
+        json.dump(manifest, file)
+    os.replace(tmp_path, manifest_path)
+
+
+def update_chunk_metadata(vector_store, splits):
+    """
+    Rewrite the metadata of stored chunks whose text did not change
+
+    Chroma collections are updated in place without re-embedding. Other
+    stores get the chunks deleted and added again.
+    """
+    ids = [split.metadata['chunk_id'] for split in splits]
+    collection = getattr(vector_store, "_collection", None)
+    if collection is not None:
+        collection.update(ids=ids, metadatas=[split.metadata for split in splits])
+        record_index_write(vector_store)
+        return
+    vector_store.delete(ids=ids)
+    vector_store.add_documents(documents=splits, ids=ids)
+
+
+def sync_source(vector_store, source, splits, manifest):
+    """
+    Bring the vector store in line with the current splits of one source
+
+    Only chunks whose ID is new are embedded and upserted, and chunks that
+    disappeared from the source are deleted. Unchanged chunks that moved
+    within the file (an earlier edit shifted their start_index) get their
+    metadata rewritten, so offsets used by context assembly stay correct.
+    The manifest entry of the source is updated in place.
+
+    Returns:
+        dict: Number of chunks added, deleted, moved and left unchanged
+    """
+    chunks = assign_chunk_ids(source, splits)
+    previous_entry = manifest['sources'].get(source, {})
+    previous = previous_entry.get('chunks', {})
+    previous_starts = previous_entry.get('starts', {})
+    starts = {split.metadata['chunk_id']: split.metadata.get('start_index') for split in splits}
+
+    added_ids = [chunk_id for chunk_id in chunks if chunk_id not in previous]
+    deleted_ids = [chunk_id for chunk_id in previous if chunk_id not in chunks]
+
+    if added_ids:
+        added = set(added_ids)
+        new_splits = [split for split in splits if split.metadata['chunk_id'] in added]
+        vector_store.add_documents(documents=new_splits, ids=added_ids)
+    if deleted_ids:
+        vector_store.delete(ids=deleted_ids)
+    if added_ids or deleted_ids:
+        record_index_write(vector_store)
+    # Manifests written before offsets were recorded have no starts: rewrite every kept chunk once
+    moved = [
+        split for split in splits
+        if split.metadata['chunk_id'] in previous
+        and previous_starts.get(split.metadata['chunk_id'], -1) != starts[split.metadata['chunk_id']]
+    ]
+    if moved:
+        update_chunk_metadata(vector_store, moved)
+
+    entry = manifest['sources'].setdefault(source, {})
+    entry['chunks'] = chunks
+    entry['starts'] = starts
+    return {
+        'added': len(added_ids),
+        'deleted': len(deleted_ids),
+        'moved': len(moved),
+        'unchanged': len(chunks) - len(added_ids),
+    }
+
+
+def incremental_ingest(vector_store, file_paths, text_splitter, manifest_path, prune_missing=False):
+    """
+    Incrementally index text files into a persisted vector store
+
+    A manifest of chunk IDs and content hashes is kept per source file. Files
+    whose bytes did not change are skipped entirely; for changed files only new
+    or edited chunks are upserted and removed chunks are deleted.
+
+    Args:
+        vector_store: A persisted vector store supporting add_documents(ids=...) and delete(ids=...)
+        file_paths: Paths of the text files to index
+        text_splitter: Splitter used to chunk each file
+        manifest_path: Where the manifest is stored between runs
+        prune_missing: Delete chunks of sources that are in the manifest but not in file_paths
+
+    Returns:
+        dict: Report with the number of files and chunks touched
+    """
+    manifest = load_manifest(manifest_path)
+    report = {
+        'files_scanned': 0,
+        'files_changed': 0,
+        'files_removed': 0,
+        'chunks_added': 0,
+        'chunks_deleted': 0,
+        'chunks_moved': 0,
+        'chunks_unchanged': 0,
+    }
+
+    for path in file_paths:
+        source = os.path.abspath(path)
+        report['files_scanned'] += 1
+        current_hash = file_hash(path)
+        entry = manifest['sources'].get(source)
+
+        if entry and entry['file_hash'] == current_hash:
+            report['chunks_unchanged'] += len(entry['chunks'])
+            continue
+
+        documents = TextLoader(path).load()
+        splits = text_splitter.split_documents(documents)
+        counts = sync_source(vector_store, source, splits, manifest)
+        manifest['sources'][source]['file_hash'] = current_hash
+        # Save after every file so an interrupted run keeps the work done so far
+        save_manifest(manifest_path, manifest)
+
+        report['files_changed'] += 1
+        report['chunks_added'] += counts['added']
+        report['chunks_deleted'] += counts['deleted']
+        report['chunks_moved'] += counts['moved']
+        report['chunks_unchanged'] += counts['unchanged']
+
+    if prune_missing:
+        current_sources = {os.path.abspath(path) for path in file_paths}
+        for source in list(manifest['sources']):
+            if source in current_sources:
+                continue
+            stale_ids = list(manifest['sources'][source]['chunks'])
+            if stale_ids:
+                vector_store.delete(ids=stale_ids)
+                record_index_write(vector_store)
+            del manifest['sources'][source]
+            report['files_removed'] += 1
+            report['chunks_deleted'] += len(stale_ids)
+        save_manifest(manifest_path, manifest)
+
+    report['chunks_touched'] = report['chunks_added'] + report['chunks_deleted']
+    return report
+
+
+def print_ingest_report(report):
+    """Print an incremental ingest report in a formatted way"""
+    print("\n=== Incremental Ingest Report ===")
+    print(f"Files scanned: {report['files_scanned']}")
+    print(f"Files changed: {report['files_changed']}")
+    print(f"Files removed: {report['files_removed']}")
+    print(f"Chunks added: {report['chunks_added']}")
+    print(f"Chunks deleted: {report['chunks_deleted']}")
+    print(f"Chunks moved (metadata rewritten): {report['chunks_moved']}")
+    print(f"Chunks unchanged: {report['chunks_unchanged']}")
+    print(f"Chunks touched: {report['chunks_touched']}")
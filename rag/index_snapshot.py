@@ -0,0 +1,159 @@
+import json
+import mmap
+import os
+import struct
+
+import numpy as np
+from langchain_core.documents import Document
+
+# File layout: magic, header length, JSON header, then 64-byte aligned sections
+SNAPSHOT_MAGIC = b"RAGSNAP1"
+SNAPSHOT_VERSION = 1
+_ALIGNMENT = 64
+
+
+def _encode_strings(strings):
+    """Pack strings into one UTF-8 blob plus an offsets array"""
+    encoded = [string.encode("utf-8") for string in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(item) for item in encoded], out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+class MappedStrings:
+    """Read-only sequence of strings decoded on access from a mapped blob"""
+
+    def __init__(self, blob, offsets):
+        self._blob = blob
+        self._offsets = offsets
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index):
+        index = int(index)
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        start, end = self._offsets[index], self._offsets[index + 1]
+        return self._blob[start:end].tobytes().decode("utf-8")
+
+
+class MappedDocuments:
+    """Read-only sequence of Documents, only the requested records are parsed"""
+
+    def __init__(self, ids, records):
+        self._ids = ids
+        self._records = records
+
+    def __len__(self):
+        return len(self._records)
+
+    def __getitem__(self, index):
+        record = json.loads(self._records[index])
+        return Document(id=self._ids[index], page_content=record['text'], metadata=record['metadata'])
+
+
+def write_snapshot(path, header, arrays):
+    """
+    Write named arrays and a JSON header into one snapshot file
+
+    The file is written next to its destination and renamed into place, so
+    processes that have the previous snapshot mapped keep a consistent view.
+    """
+    sections = {}
+    offset = 0
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        offset = -(-offset // _ALIGNMENT) * _ALIGNMENT
+        sections[name] = {'offset': offset, 'dtype': array.dtype.str, 'shape': list(array.shape)}
+        offset += array.nbytes
+
+    header_bytes = json.dumps({**header, 'snapshot_version': SNAPSHOT_VERSION, 'sections': sections}).encode("utf-8")
+    data_start = -(-(len(SNAPSHOT_MAGIC) + 8 + len(header_bytes)) // _ALIGNMENT) * _ALIGNMENT
+
+    tmp_path = path + ".tmp"
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(tmp_path, "wb") as file:
+        file.write(SNAPSHOT_MAGIC)
+        file.write(struct.pack("<Q", len(header_bytes)))
+        file.write(header_bytes)
+        for name, array in arrays.items():
+            file.seek(data_start + sections[name]['offset'])
+            file.write(np.ascontiguousarray(array).tobytes())
+        file.truncate(data_start + offset)
+    os.replace(tmp_path, path)
+
+
+def open_snapshot(path):
+    """
+    Memory-map a snapshot file
+
+    Arrays are zero-copy views on the mapping: pages are only read from disk
+    when touched, and processes that open the same file share them through
+    the OS page cache.
+
+    Returns:
+        tuple: (header, {name: array})
+    """
+    with open(path, "rb") as file:
+        mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    if mapping[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+        raise ValueError(f"{path} is not an index snapshot")
+    header_start = len(SNAPSHOT_MAGIC) + 8
+    (header_length,) = struct.unpack("<Q", mapping[len(SNAPSHOT_MAGIC):header_start])
+    header = json.loads(mapping[header_start:header_start + header_length].decode("utf-8"))
+    if header.get('snapshot_version') != SNAPSHOT_VERSION:
+        raise ValueError(f"Unsupported snapshot version in {path}: {header.get('snapshot_version')}")
+
+    data_start = -(-(header_start + header_length) // _ALIGNMENT) * _ALIGNMENT
+    arrays = {}
+    for name, section in header['sections'].items():
+        dtype = np.dtype(section['dtype'])
+        count = int(np.prod(section['shape']))
+        arrays[name] = np.frombuffer(
+            mapping, dtype=dtype, count=count, offset=data_start + section['offset']
+        ).reshape(section['shape'])
+    return header, arrays
+
+
+def save_store_snapshot(store, path):
+    """Write a NumpyVectorStore (or subclass) to a single snapshot file"""
+    ids_blob, ids_offsets = _encode_strings(store._ids[row] for row in range(len(store)))
+    records_blob, records_offsets = _encode_strings(
+        json.dumps({'text': doc.page_content, 'metadata': doc.metadata})
+        for doc in (store._documents[row] for row in range(len(store)))
+    )
+    arrays = {
+        'matrix': store.matrix,
+        'ids_blob': ids_blob,
+        'ids_offsets': ids_offsets,
+        'records_blob': records_blob,
+        'records_offsets': records_offsets,
+    }
+    index_arrays = store._index_arrays()
+    arrays.update({f"index.{name}": array for name, array in index_arrays.items()})
+    header = {
+        'type': type(store).__name__,
+        'params': store._index_params(),
+        'count': len(store),
+    }
+    write_snapshot(path, header, arrays)
+
+
+def load_store_snapshot(cls, path, embedding):
+    """Open a snapshot written by save_store_snapshot() as a store of class cls"""
+    header, arrays = open_snapshot(path)
+    if header['type'] != cls.__name__:
+        raise ValueError(f"{path} holds a {header['type']}, not a {cls.__name__}")
+
+    store = cls(embedding, **header['params'])
+    ids = MappedStrings(arrays['ids_blob'], arrays['ids_offsets'])
+    records = MappedStrings(arrays['records_blob'], arrays['records_offsets'])
+    store._attach(arrays['matrix'], ids, MappedDocuments(ids, records))
+    store._restore_index_arrays({
+        name[len("index."):]: array for name, array in arrays.items() if name.startswith("index.")
+    })
+    return store
@@ -0,0 +1,285 @@
+import queue
+import threading
+import time
+import uuid
+
+from langchain_community.document_loaders import TextLoader
+
+from query_cache import record_index_write
+
+# Marks the end of a stage's output
+_DONE = object()
+
+
+def upsert_embeddings(vector_store, documents, vectors, ids=None):
+    """
+    Write documents with precomputed vectors into a vector store
+
+    Stores that accept vectors directly are used as-is; for Chroma the
+    underlying collection is upserted, which is what Chroma.add_documents
+    does after embedding. Other stores fall back to add_documents, which
+    re-embeds the text.
+    """
+    if ids is None:
+        ids = [doc.metadata.get('chunk_id') or str(uuid.uuid4()) for doc in documents]
+
+    if hasattr(vector_store, "add_embeddings"):
+        vector_store.add_embeddings(
+            texts=[doc.page_content for doc in documents],
+            embeddings=vectors,
+            metadatas=[doc.metadata for doc in documents],
+            ids=ids
+        )
+    elif hasattr(vector_store, "_collection"):
+        vector_store._collection.upsert(
+            ids=ids,
+            embeddings=vectors,
+            documents=[doc.page_content for doc in documents],
+            metadatas=[doc.metadata or None for doc in documents]
+        )
+        record_index_write(vector_store)
+    else:
+        vector_store.add_documents(documents=documents, ids=ids)
+    return ids
+
+
+class StageMetrics:
+    """Throughput counters for one pipeline stage"""
+
+    def __init__(self, name):
+        self.name = name
+        self.items_in = 0
+        self.items_out = 0
+        self.busy_seconds = 0.0
+
+    def as_dict(self):
+        return {
+            'items_in': self.items_in,
+            'items_out': self.items_out,
+            'busy_seconds': self.busy_seconds,
+            'items_per_second': self.items_in / self.busy_seconds if self.busy_seconds else 0.0,
+        }
+
+
+class MonitoredQueue:
+    """A bounded queue that records its depth every time an item is added"""
+
+    def __init__(self, name, maxsize):
+        self.name = name
+        self.maxsize = maxsize
+        self._queue = queue.Queue(maxsize=maxsize)
+        self.max_depth = 0
+        self._depth_total = 0
+        self._samples = 0
+
+    def put(self, item, stop_event):
+        # Block while the queue is full (backpressure), but give up if the pipeline stops
+        while not stop_event.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+            except queue.Full:
+                continue
+            depth = self._queue.qsize()
+            self.max_depth = max(self.max_depth, depth)
+            self._depth_total += depth
+            self._samples += 1
+            return True
+        return False
+
+    def get(self, stop_event):
+        while not stop_event.is_set():
+            try:
+                return self._queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def as_dict(self):
+        return {
+            'maxsize': self.maxsize,
+            'depth': self._queue.qsize(),
+            'max_depth': self.max_depth,
+            'mean_depth': self._depth_total / self._samples if self._samples else 0.0,
+        }
+
+
+class IngestPipeline:
+    """
+    Streaming ingestion pipeline: load -> split -> embed -> upsert
+
+    Each stage runs in its own thread and stages are connected by bounded
+    queues. A full queue blocks the stage feeding it, so at most queue_size
+    items wait between any two stages and memory stays flat no matter how
+    large the corpus is, while loading, splitting, embedding and upserting
+    all overlap. The embed stage can run several workers, so that many
+    embedding requests are in flight while the other stages keep going.
+
+    Args:
+        vector_store: The vector store to populate
+        embeddings: Embeddings model used by the embed stage
+        text_splitter: Splitter used by the split stage
+        queue_size: Capacity of each queue between stages
+        embed_batch_size: Number of chunks embedded and upserted together
+        dedup: Optional NearDuplicateFilter applied by the split stage, so duplicates
+            never reach the embed stage
+        embed_workers: Number of embed stage threads, i.e. concurrent embedding requests.
+            Their busy time is summed, so embed items/s is per worker.
+    """
+
+    def __init__(self, vector_store, embeddings, text_splitter, queue_size=8, embed_batch_size=64, dedup=None,
+                 embed_workers=1):
+        self.vector_store = vector_store
+        self.embeddings = embeddings
+        self.text_splitter = text_splitter
+        self.embed_batch_size = embed_batch_size
+        self.dedup = dedup
+        self.embed_workers = embed_workers
+
+        self.stages = {name: StageMetrics(name) for name in ("load", "split", "embed", "upsert")}
+        self.queues = {
+            name: MonitoredQueue(name, queue_size)
+            for name in ("documents", "splits", "vectors")
+        }
+        self._stop = threading.Event()
+        self._errors = []
+        self.wall_seconds = 0.0
+        # Shared by the embed workers for their metrics and for counting finished workers
+        self._embed_lock = threading.Lock()
+        self._embed_running = 0
+
+    def _load(self, file_paths):
+        metrics = self.stages["load"]
+        for path in file_paths:
+            start = time.perf_counter()
+            documents = TextLoader(path).load()
+            metrics.busy_seconds += time.perf_counter() - start
+            metrics.items_in += 1
+            for document in documents:
+                document.metadata['source'] = path
+                if not self.queues["documents"].put(document, self._stop):
+                    return
+                metrics.items_out += 1
+
+    def _split(self):
+        metrics = self.stages["split"]
+        batch = []
+        while True:
+            document = self.queues["documents"].get(self._stop)
+            if document is _DONE:
+                break
+            start = time.perf_counter()
+            splits = self.text_splitter.split_documents([document])
+            for index, split in enumerate(splits):
+                split.metadata['chunk_index'] = index
+            if self.dedup is not None:
+                splits = self.dedup.filter(splits)
+            metrics.busy_seconds += time.perf_counter() - start
+            metrics.items_in += 1
+
+            batch.extend(splits)
+            while len(batch) >= self.embed_batch_size:
+                if not self.queues["splits"].put(batch[:self.embed_batch_size], self._stop):
+                    return
+                metrics.items_out += self.embed_batch_size
+                batch = batch[self.embed_batch_size:]
+        if batch and self.queues["splits"].put(batch, self._stop):
+            metrics.items_out += len(batch)
+
+    def _embed(self):
+        metrics = self.stages["embed"]
+        while True:
+            batch = self.queues["splits"].get(self._stop)
+            if batch is _DONE:
+                # Pass the end marker on to the other embed workers
+                self.queues["splits"].put(_DONE, self._stop)
+                break
+            start = time.perf_counter()
+            vectors = self.embeddings.embed_documents([split.page_content for split in batch])
+            with self._embed_lock:
+                metrics.busy_seconds += time.perf_counter() - start
+                metrics.items_in += len(batch)
+            if not self.queues["vectors"].put((batch, vectors), self._stop):
+                return
+            with self._embed_lock:
+                metrics.items_out += len(batch)
+
+    def _run_embed_worker(self):
+        """Run one embed worker; the last one to finish signals the upsert stage"""
+        try:
+            self._run_stage(self._embed, None)
+        finally:
+            with self._embed_lock:
+                self._embed_running -= 1
+                last = self._embed_running == 0
+            if last:
+                self.queues["vectors"].put(_DONE, self._stop)
+
+    def _upsert(self):
+        metrics = self.stages["upsert"]
+        while True:
+            item = self.queues["vectors"].get(self._stop)
+            if item is _DONE:
+                break
+            batch, vectors = item
+            start = time.perf_counter()
+            upsert_embeddings(self.vector_store, batch, vectors)
+            metrics.busy_seconds += time.perf_counter() - start
+            metrics.items_in += len(batch)
+            metrics.items_out += len(batch)
+
+    def _run_stage(self, target, output_queue, *args):
+        """Run a stage, then signal the next stage that no more items are coming"""
+        try:
+            target(*args)
+        except Exception as error:
+            self._errors.append(error)
+            self._stop.set()
+        finally:
+            if output_queue is not None:
+                output_queue.put(_DONE, self._stop)
+
+    def run(self, file_paths):
+        """
+        Ingest the given files and block until every stage has finished
+
+        Returns:
+            dict: Per-stage and per-queue metrics (see metrics())
+        """
+        start = time.perf_counter()
+        self._embed_running = self.embed_workers
+        threads = [
+            threading.Thread(target=self._run_stage, args=(self._load, self.queues["documents"], file_paths)),
+            threading.Thread(target=self._run_stage, args=(self._split, self.queues["splits"])),
+            *(threading.Thread(target=self._run_embed_worker) for _ in range(self.embed_workers)),
+            threading.Thread(target=self._run_stage, args=(self._upsert, None)),
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.wall_seconds = time.perf_counter() - start
+
+        if self._errors:
+            raise self._errors[0]
+        return self.metrics()
+
+    def metrics(self):
+        """Return throughput per stage and depth per queue as a dictionary"""
+        return {
+            'wall_seconds': self.wall_seconds,
+            'stages': {name: stage.as_dict() for name, stage in self.stages.items()},
+            'queues': {name: q.as_dict() for name, q in self.queues.items()},
+        }
+
+
+def print_pipeline_metrics(metrics):
+    """Print pipeline metrics in a formatted way"""
+    print("\n=== Ingest Pipeline Metrics ===")
+    print(f"Wall time: {metrics['wall_seconds']:.2f}s")
+    print("\nStages:")
+    for name, stage in metrics['stages'].items():
+        print(f"  {name:<7} in={stage['items_in']:<6} out={stage['items_out']:<6} "
+              f"busy={stage['busy_seconds']:.2f}s  {stage['items_per_second']:.1f} items/s")
+    print("\nQueues:")
+    for name, q in metrics['queues'].items():
+        print(f"  {name:<9} max_depth={q['max_depth']}/{q['maxsize']}  mean_depth={q['mean_depth']:.1f}")
@@ -0,0 +1,245 @@
+import json
+import os
+import threading
+import time
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from benchmark_utils import latency_summary
+
+# Upper edges (ms) of the latency histogram buckets; the last bucket is open-ended
+HISTOGRAM_EDGES_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+HISTOGRAM_LABELS = [f"<={edge}" for edge in HISTOGRAM_EDGES_MS] + [f">{HISTOGRAM_EDGES_MS[-1]}"]
+
+
+class _NullSpan:
+    """Span that records nothing, shared by every call on a disabled tracer"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def set(self, **attributes):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class NullTracer:
+    """
+    Tracer used when instrumentation is off
+
+    span() returns one shared no-op context manager, so an instrumented
+    code path costs a method call and a with-block per stage. Callers check
+    enabled before computing anything only a span would use (token counts).
+    """
+
+    enabled = False
+
+    def span(self, name, **attributes):
+        return _NULL_SPAN
+
+
+NULL_TRACER = NullTracer()
+
+
+class _Span:
+    __slots__ = ('tracer', 'name', 'attributes', 'start', 'child_seconds', 'parent')
+
+    def __init__(self, tracer, name, attributes):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+        self.child_seconds = 0.0
+
+    def set(self, **attributes):
+        """Attach values to the span, e.g. token counts"""
+        self.attributes.update(attributes)
+
+    def __enter__(self):
+        stack = self.tracer._stack()
+        self.parent = stack[-1] if stack else None
+        stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        end = time.perf_counter()
+        self.tracer._stack().pop()
+        duration = end - self.start
+        if self.parent is not None:
+            self.parent.child_seconds += duration
+        if exc_type is not None:
+            self.attributes['error'] = exc_type.__name__
+        self.tracer._record({
+            'name': self.name,
+            'parent': self.parent.name if self.parent is not None else None,
+            'start': self.start - self.tracer.origin,
+            'duration': duration,
+            'self_duration': duration - self.child_seconds,
+            'thread': threading.get_ident(),
+            'attributes': self.attributes,
+        })
+        return False
+
+
+class Tracer:
+    """
+    Collect timing spans of the RAG query path
+
+    Spans nest per thread, so stages of concurrently answered questions are
+    kept apart. Each span stores its duration and its self time (duration
+    minus nested spans), e.g. retrieval self time is the vector search
+    without the query embedding.
+
+    Args:
+        max_spans: Spans kept in memory; later spans are counted as dropped
+    """
+
+    enabled = True
+
+    def __init__(self, max_spans=1_000_000):
+        self.max_spans = max_spans
+        self.origin = time.perf_counter()
+        self.spans = []
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def span(self, name, **attributes):
+        """Context manager timing one stage"""
+        return _Span(self, name, attributes)
+
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _record(self, span):
+        with self._lock:
+            if len(self.spans) < self.max_spans:
+                self.spans.append(span)
+            else:
+                self.dropped += 1
+
+    def summary(self):
+        """
+        Per-stage latency percentiles, histograms and token totals
+
+        Returns:
+            dict: {stage name: {'count', 'duration', 'self', 'histogram', 'tokens'}} where
+            duration and self hold mean/p50/p95/p99/max in milliseconds, histogram maps
+            bucket upper edges (ms) to counts and tokens sums every *_tokens attribute
+        """
+        with self._lock:
+            spans = list(self.spans)
+        by_name = {}
+        for span in spans:
+            by_name.setdefault(span['name'], []).append(span)
+
+        summary = {}
+        for name, group in by_name.items():
+            durations = [span['duration'] for span in group]
+            buckets = np.searchsorted(HISTOGRAM_EDGES_MS, np.array(durations) * 1000)
+            counts = np.bincount(buckets, minlength=len(HISTOGRAM_EDGES_MS) + 1)
+            tokens = {}
+            for span in group:
+                for key, value in span['attributes'].items():
+                    if key.endswith("_tokens") and isinstance(value, (int, float)):
+                        tokens[key] = tokens.get(key, 0) + value
+            summary[name] = {
+                'count': len(group),
+                'duration': latency_summary(durations),
+                'self': latency_summary([span['self_duration'] for span in group]),
+                'histogram': dict(zip(HISTOGRAM_LABELS, counts.tolist())),
+                'tokens': tokens,
+            }
+        return summary
+
+    def export_json(self, path):
+        """Write the summary and every span to a JSON file"""
+        with self._lock:
+            spans = list(self.spans)
+        _write_json(path, {'summary': self.summary(), 'dropped_spans': self.dropped, 'spans': spans})
+
+    def export_chrome_trace(self, path):
+        """Write the spans in Chrome trace event format, for chrome://tracing or Perfetto"""
+        with self._lock:
+            spans = list(self.spans)
+        pid = os.getpid()
+        events = [{
+            'name': span['name'],
+            'cat': "rag",
+            'ph': "X",
+            'ts': span['start'] * 1e6,
+            'dur': span['duration'] * 1e6,
+            'pid': pid,
+            'tid': span['thread'],
+            'args': span['attributes'],
+        } for span in spans]
+        _write_json(path, {'traceEvents': events, 'displayTimeUnit': "ms"})
+
+
+class TracedEmbeddings(Embeddings):
+    """
+    Time query embeddings as "query_embedding" spans
+
+    Documents are passed through untimed, so ingestion is not mixed into
+    the query path. Wrap the outermost embeddings object so cache hits are
+    timed as well.
+
+    Args:
+        embeddings: The embeddings object to wrap
+        tracer: Tracer receiving the spans
+    """
+
+    def __init__(self, embeddings, tracer):
+        self.embeddings = embeddings
+        self.tracer = tracer
+
+    @property
+    def model(self):
+        """Model name of the wrapped embeddings, so caches can be stacked"""
+        return getattr(self.embeddings, "model", None)
+
+    @property
+    def dimensions(self):
+        return getattr(self.embeddings, "dimensions", None)
+
+    def embed_documents(self, texts):
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text):
+        with self.tracer.span("query_embedding", queries=1):
+            return self.embeddings.embed_query(text)
+
+    def embed_queries(self, texts):
+        with self.tracer.span("query_embedding", queries=len(texts)):
+            embed_queries = getattr(self.embeddings, "embed_queries", None)
+            if embed_queries is not None:
+                return embed_queries(texts)
+            return [self.embeddings.embed_query(text) for text in texts]
+
+
+def _write_json(path, data):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as file:
+        json.dump(data, file, default=str)
+
+
+def print_trace_summary(summary):
+    """Print per-stage latency percentiles and token totals"""
+    print("\n=== Query Path Timing ===")
+    print(f"{'stage':<18} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'self p50':>9}  tokens")
+    for name, stage in summary.items():
+        duration = stage['duration']
+        tokens = ", ".join(f"{key}={value}" for key, value in stage['tokens'].items())
+        print(f"{name:<18} {stage['count']:>6} {duration['p50_ms']:>9.2f} {duration['p95_ms']:>9.2f} "
+              f"{duration['p99_ms']:>9.2f} {stage['self']['p50_ms']:>9.2f}  {tokens}")
@@ -0,0 +1,268 @@
+import threading
+import time
+
+import numpy as np
+
+from numpy_vector_store import NumpyVectorStore, normalize_rows, top_k
+
+# Rows assigned to centroids at a time, bounds the size of the score matrix
+_ASSIGN_BLOCK_ROWS = 16384
+
+
+def assign_to_centroids(vectors, centroids):
+    """Return the index of the most similar centroid for every row"""
+    assignments = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), _ASSIGN_BLOCK_ROWS):
+        block = np.asarray(vectors[start:start + _ASSIGN_BLOCK_ROWS], dtype=np.float32)
+        assignments[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return assignments
+
+
+def train_kmeans(vectors, n_clusters, iterations=10, seed=0):
+    """
+    Spherical k-means on normalized vectors
+
+    Returns:
+        np.ndarray: Normalized centroids of shape (n_clusters, dim)
+    """
+    rng = np.random.default_rng(seed)
+    vectors = np.asarray(vectors, dtype=np.float32)
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+
+    for _ in range(iterations):
+        assignments = assign_to_centroids(vectors, centroids)
+        # Sum the members of every cluster with one sort and a segmented reduce
+        order = np.argsort(assignments, kind="stable")
+        counts = np.bincount(assignments, minlength=n_clusters)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        non_empty = counts > 0
+        sums = np.add.reduceat(vectors[order], starts[non_empty], axis=0)
+
+        centroids[non_empty] = normalize_rows(sums)
+        # Re-seed empty clusters with random points
+        empty = np.flatnonzero(~non_empty)
+        if len(empty):
+            centroids[empty] = vectors[rng.choice(len(vectors), len(empty), replace=False)]
+    return centroids
+
+
+class IVFVectorStore(NumpyVectorStore):
+    """
+    Approximate nearest-neighbour index with an inverted file (IVF) layout
+
+    Vectors are clustered with k-means into n_lists lists. A query is compared
+    to the centroids first, and only the rows of the n_probe closest lists
+    are scored exactly. Raising n_probe trades speed for recall. The index
+    is trained lazily on the first search, and retrained when the number of
+    rows has grown by retrain_ratio since the last training. Below
+    min_train_size rows, search stays exact. Training and regrouping happen
+    under a lock and the grouped lists are published together with their
+    centroids, so concurrent searches always see a consistent index.
+
+    Args:
+        embedding: Embeddings model used for documents and queries
+        n_lists: Number of clusters (None for about 4 * sqrt(num_rows))
+        n_probe: Number of clusters scanned per query
+        dtype: Storage type of the matrix, "float32" or "float16"
+        train_sample_size: Maximum number of rows used to train k-means
+        min_train_size: Number of rows below which search is exact
+        retrain_ratio: Growth factor of the index that triggers retraining
+    """
+
+    def __init__(self, embedding, n_lists=None, n_probe=8, dtype="float32", train_sample_size=100_000,
+                 min_train_size=1024, retrain_ratio=2.0):
+        super().__init__(embedding, dtype=dtype)
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.train_sample_size = train_sample_size
+        self.min_train_size = min_train_size
+        self.retrain_ratio = retrain_ratio
+
+        self._centroids = None
+        self._assignments = np.empty(0, dtype=np.int32)
+        self._trained_size = 0
+        # (centroids, list_rows, list_offsets): list_rows[list_offsets[i]:list_offsets[i + 1]]
+        # are the rows of list i. Replaced as a whole, never modified in place.
+        self._lists = None
+        self._index_lock = threading.RLock()
+
+    @property
+    def is_trained(self):
+        return self._centroids is not None
+
+    def build_index(self, seed=0):
+        """Train the centroids on (a sample of) the current rows and assign every row"""
+        with self._index_lock:
+            matrix = self.matrix
+            n_lists = self.n_lists or max(1, int(4 * np.sqrt(len(matrix))))
+            n_lists = min(n_lists, len(matrix))
+
+            rng = np.random.default_rng(seed)
+            if len(matrix) > self.train_sample_size:
+                sample = matrix[np.sort(rng.choice(len(matrix), self.train_sample_size, replace=False))]
+            else:
+                sample = matrix
+            centroids = train_kmeans(sample, n_lists, seed=seed)
+            self._assignments = assign_to_centroids(matrix, centroids)
+            self._centroids = centroids
+            self._trained_size = len(matrix)
+            self._lists = None
+
+    def _append_rows(self, vectors):
+        with self._index_lock:
+            super()._append_rows(vectors)
+            if self.is_trained:
+                # New rows join their nearest existing list until the next retraining
+                self._assignments = np.concatenate(
+                    (self._assignments, assign_to_centroids(vectors, self._centroids))
+                )
+                self._lists = None
+
+    def _rows_removed(self, keep):
+        with self._index_lock:
+            if keep is None:
+                self._centroids = None
+                self._assignments = np.empty(0, dtype=np.int32)
+                self._trained_size = 0
+            elif self.is_trained:
+                self._assignments = self._assignments[keep]
+            self._lists = None
+
+    def _ensure_index(self):
+        """
+        Train or retrain when needed, and group rows by list
+
+        Returns:
+            tuple: (centroids, list_rows, list_offsets), or None while search is exact
+        """
+        with self._index_lock:
+            if self._size < self.min_train_size:
+                return None
+            if not self.is_trained or self._size > self.retrain_ratio * self._trained_size:
+                self.build_index()
+            if self._lists is None:
+                list_rows = np.argsort(self._assignments, kind="stable")
+                counts = np.bincount(self._assignments, minlength=len(self._centroids))
+                self._lists = (self._centroids, list_rows, np.concatenate(([0], np.cumsum(counts))))
+            return self._lists
+
+    def _search(self, queries, k):
+        index = self._ensure_index()
+        if index is None:
+            return super()._search(queries, k)
+        centroids, list_rows, list_offsets = index
+
+        n_probe = min(self.n_probe, len(centroids))
+        probed_lists, _ = top_k(queries @ centroids.T, n_probe)
+        matrix = self.matrix
+
+        indices = np.full((len(queries), k), -1, dtype=np.int64)
+        scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        for i, (query, lists) in enumerate(zip(queries, probed_lists)):
+            candidates = np.concatenate([list_rows[list_offsets[j]:list_offsets[j + 1]] for j in lists])
+            candidate_scores = np.asarray(matrix[candidates], dtype=np.float32) @ query
+            best, best_scores = top_k(candidate_scores[None, :], k)
+            indices[i, :best.shape[1]] = candidates[best[0]]
+            scores[i, :best.shape[1]] = best_scores[0]
+
+        # Drop the padding if fewer than k candidates were found for every query
+        found = int((indices >= 0).sum(axis=1).max()) if len(queries) else 0
+        return indices[:, :found], scores[:, :found]
+
+    def _results(self, indices, scores):
+        return [(self._documents[row], float(score)) for row, score in zip(indices, scores) if row >= 0]
+
+    def _index_params(self):
+        return {
+            **super()._index_params(),
+            'n_lists': self.n_lists,
+            'n_probe': self.n_probe,
+            'train_sample_size': self.train_sample_size,
+            'min_train_size': self.min_train_size,
+            'retrain_ratio': self.retrain_ratio,
+        }
+
+    def _index_arrays(self):
+        with self._index_lock:
+            index = self._ensure_index()
+            if index is None:
+                return {}
+            centroids, list_rows, list_offsets = index
+            # The grouped lists are saved too, so an opened snapshot can be searched right away
+            return {
+                'centroids': centroids,
+                'assignments': self._assignments,
+                'trained_size': np.array([self._trained_size]),
+                'list_rows': list_rows,
+                'list_offsets': list_offsets,
+            }
+
+    def _restore_index_arrays(self, arrays):
+        if 'centroids' in arrays:
+            self._centroids = arrays['centroids']
+            self._assignments = arrays['assignments']
+            self._trained_size = int(arrays['trained_size'][0])
+            self._lists = (self._centroids, arrays['list_rows'], arrays['list_offsets'])
+
+
+def make_clustered_vectors(num_vectors, dim, num_clusters=256, noise=1.0, seed=0):
+    """Synthetic embeddings with cluster structure similar to real text embeddings"""
+    rng = np.random.default_rng(seed)
+    centers = normalize_rows(np.random.default_rng(0).standard_normal((num_clusters, dim)))
+    members = centers[rng.integers(0, num_clusters, num_vectors)]
+    return normalize_rows(members + noise * rng.standard_normal((num_vectors, dim)) / np.sqrt(dim))
+
+
+def _search_one_by_one(store, queries, k):
+    """Run queries one at a time like an online service, returning (indices, seconds)"""
+    start = time.perf_counter()
+    indices = [store._search(query[None, :], k)[0][0] for query in queries]
+    return indices, time.perf_counter() - start
+
+
+def benchmark_ann(num_vectors=100_000, dim=256, num_queries=500, k=10, n_probe_values=(1, 4, 8, 16, 32)):
+    """
+    Compare IVF search with exact search on synthetic vectors
+
+    Returns:
+        dict: Build time, exact QPS, and recall@k / QPS for every n_probe value
+    """
+    vectors = make_clustered_vectors(num_vectors, dim)
+    queries = make_clustered_vectors(num_queries, dim, seed=1)
+    texts = [f"chunk {i}" for i in range(num_vectors)]
+
+    exact = NumpyVectorStore(embedding=None)
+    exact.add_embeddings(texts, vectors)
+    exact_indices, exact_seconds = _search_one_by_one(exact, queries, k)
+
+    ivf = IVFVectorStore(embedding=None)
+    ivf.add_embeddings(texts, vectors)
+    start = time.perf_counter()
+    ivf.build_index()
+    build_seconds = time.perf_counter() - start
+
+    results = {'build_seconds': build_seconds, 'exact_qps': num_queries / exact_seconds, 'n_probe': []}
+    for n_probe in n_probe_values:
+        ivf.n_probe = n_probe
+        indices, seconds = _search_one_by_one(ivf, queries, k)
+        hits = sum(len(set(found) & set(expected)) for found, expected in zip(indices, exact_indices))
+        results['n_probe'].append({
+            'n_probe': n_probe,
+            'recall_at_k': hits / (num_queries * k),
+            'qps': num_queries / seconds,
+        })
+    return results
+
+
+def main():
+    k = 10
+    results = benchmark_ann(k=k)
+    print("\n=== IVF vs Exact Search ===")
+    print(f"Index build time: {results['build_seconds']:.2f}s")
+    print(f"Exact search: {results['exact_qps']:.0f} queries/s")
+    for result in results['n_probe']:
+        print(f"n_probe={result['n_probe']:<3} recall@{k}={result['recall_at_k']:.3f}  {result['qps']:.0f} queries/s")
+
+
+if __name__ == "__main__":
+    main()
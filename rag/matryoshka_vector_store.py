@@ -0,0 +1,165 @@
+import argparse
+import time
+
+import numpy as np
+
+from benchmark_utils import STORY_PATH, load_qa_pairs, load_splits, make_benchmark_embeddings
+from numpy_vector_store import NumpyVectorStore, RescoringVectorStore, normalize_rows
+
+
+class TruncatedVectorStore(RescoringVectorStore):
+    """
+    Two-stage Matryoshka index: search at low dimension, re-rank at full dimension
+
+    text-embedding-3 models are trained so that a prefix of the embedding is
+    itself a usable embedding. This index keeps the first search_dimensions
+    dimensions of every vector (renormalized) in a separate matrix, scans
+    that to build a shortlist of k * rescore_factor rows, and re-ranks the
+    shortlist with the full vectors. Dot-product cost of the scan drops by
+    full_dim / search_dimensions.
+
+    For a single-stage reduced index, request shorter vectors from the API
+    instead (create_rag_system(embedding_dimensions=...)).
+
+    Args:
+        embedding: Embeddings model used for documents and queries
+        search_dimensions: Number of leading dimensions used by the first stage
+        rescore_factor: Shortlist size as a multiple of k (1 disables re-ranking)
+        dtype: Storage type of both matrices
+    """
+
+    def __init__(self, embedding, search_dimensions=256, rescore_factor=4, dtype="float32"):
+        super().__init__(embedding, rescore_factor=rescore_factor, dtype=dtype)
+        self.search_dimensions = search_dimensions
+        self._prefix = None
+
+    def _truncate(self, vectors):
+        return normalize_rows(np.asarray(vectors, dtype=np.float32)[:, :self.search_dimensions])
+
+    def _append_rows(self, vectors):
+        super()._append_rows(vectors)
+        prefix = self._truncate(vectors).astype(self.dtype)
+        self._prefix = prefix if self._prefix is None else np.concatenate((self._prefix, prefix))
+
+    def _rows_removed(self, keep):
+        self._prefix = None if keep is None else self._prefix[keep]
+
+    def _approximate_scores(self, queries):
+        return self._truncate(queries) @ np.asarray(self._prefix, dtype=np.float32).T
+
+    def _index_params(self):
+        return {**super()._index_params(), 'search_dimensions': self.search_dimensions}
+
+    def _index_arrays(self):
+        return {} if self._prefix is None else {'prefix': self._prefix}
+
+    def _restore_index_arrays(self, arrays):
+        self._prefix = arrays.get('prefix')
+
+
+def add_distractors(vectors, count, seed=0):
+    """Pad a small corpus with random unrelated vectors so search latency is measurable"""
+    vectors = normalize_rows(vectors)
+    if count <= 0:
+        return vectors
+    rng = np.random.default_rng(seed)
+    distractors = rng.standard_normal((count, vectors.shape[1])).astype(np.float32)
+    return np.concatenate((vectors, normalize_rows(distractors)))
+
+
+def sweep_dimensions(vectors, query_vectors, dimensions, rescore_factors=(1, 4), k=2):
+    """
+    Measure retrieval quality and latency for a grid of search dimensions
+
+    Quality is recall@k against exact search at full dimension.
+
+    Returns:
+        list: One result per (dimensions, rescore_factor)
+    """
+    texts = [str(i) for i in range(len(vectors))]
+    query_vectors = normalize_rows(query_vectors)
+
+    exact = NumpyVectorStore(embedding=None)
+    exact.add_embeddings(texts, vectors)
+    expected, _ = exact._search(query_vectors, k)
+
+    def timed_search(store):
+        start = time.perf_counter()
+        found = [store._search(query[None, :], k)[0][0] for query in query_vectors]
+        return found, (time.perf_counter() - start) * 1000 / len(query_vectors)
+
+    _, full_ms = timed_search(exact)
+    results = [{'dimensions': vectors.shape[1], 'rescore_factor': None, 'recall': 1.0, 'ms_per_query': full_ms}]
+    for dims in dimensions:
+        if dims >= vectors.shape[1]:
+            continue
+        for rescore_factor in rescore_factors:
+            store = TruncatedVectorStore(None, search_dimensions=dims, rescore_factor=rescore_factor)
+            store.add_embeddings(texts, vectors)
+            found, ms_per_query = timed_search(store)
+            recall = np.mean([len(set(a) & set(b)) / len(b) for a, b in zip(found, expected)])
+            results.append({
+                'dimensions': dims,
+                'rescore_factor': rescore_factor,
+                'recall': float(recall),
+                'ms_per_query': ms_per_query,
+            })
+    return results
+
+
+def plot_sweep(results, path, k):
+    """Plot recall against latency, one line per re-ranking setting"""
+    try:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+    except ImportError:
+        print("matplotlib is not installed, skipping the plot")
+        return
+
+    fig, ax = plt.subplots(figsize=(7, 5))
+    for rescore_factor in sorted({r['rescore_factor'] for r in results if r['rescore_factor'] is not None}):
+        points = sorted((r for r in results if r['rescore_factor'] == rescore_factor), key=lambda r: r['dimensions'])
+        label = "low-dim only" if rescore_factor <= 1 else f"re-rank top {rescore_factor}k at full dim"
+        ax.plot([p['ms_per_query'] for p in points], [p['recall'] for p in points], marker="o", label=label)
+        for p in points:
+            ax.annotate(str(p['dimensions']), (p['ms_per_query'], p['recall']), fontsize=8)
+    full = next(r for r in results if r['rescore_factor'] is None)
+    ax.scatter([full['ms_per_query']], [1.0], marker="*", s=120, label=f"full {full['dimensions']} dims")
+    ax.set_xlabel("Latency per query (ms)")
+    ax.set_ylabel(f"Recall@{k} vs full-dimension search")
+    ax.set_title("Matryoshka dimension sweep")
+    ax.legend()
+    fig.savefig(path, bbox_inches="tight")
+    print(f"Saved plot to {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep Matryoshka search dimensions on the QA pairs")
+    parser.add_argument("--fake", action="store_true", help="Use local fake embeddings instead of OpenAI")
+    parser.add_argument("--corpus", default=STORY_PATH, help="Text file to index")
+    parser.add_argument("--k", type=int, default=2, help="Number of retrieved chunks")
+    parser.add_argument("--distractors", type=int, default=20000,
+                        help="Random unrelated vectors added to the index so latency is measurable")
+    parser.add_argument("--plot", default="matryoshka_sweep.png", help="Where to save the plot")
+    args = parser.parse_args()
+
+    embeddings = make_benchmark_embeddings(fake=args.fake)
+    splits = load_splits(args.corpus)
+    questions = [qa_pair['question'] for qa_pair in load_qa_pairs()]
+    vectors = add_distractors(embeddings.embed_documents([split.page_content for split in splits]), args.distractors)
+    query_vectors = np.asarray(embeddings.embed_documents(questions), dtype=np.float32)
+
+    results = sweep_dimensions(vectors, query_vectors, dimensions=(64, 128, 256, 512, 1024, 1536), k=args.k)
+
+    print("\n=== Matryoshka Dimension Sweep ===")
+    print(f"{len(vectors)} vectors, {len(questions)} questions")
+    for result in results:
+        rescore = "-" if result['rescore_factor'] is None else f"x{result['rescore_factor']}"
+        print(f"dims={result['dimensions']:<5} rescore={rescore:<3} recall@{args.k}={result['recall']:.3f}  "
+              f"{result['ms_per_query']:.2f} ms/query")
+    plot_sweep(results, args.plot, args.k)
+
+
+if __name__ == "__main__":
+    main()
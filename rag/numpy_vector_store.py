@@ -0,0 +1,431 @@
+import uuid
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore, VectorStoreRetriever
+
+from index_snapshot import load_store_snapshot, save_store_snapshot
+
+# Rows scored at a time when the matrix is stored in float16
+_SCORE_BLOCK_ROWS = 65536
+
+
+def normalize_rows(vectors):
+    """Scale every row to unit length so a dot product equals cosine similarity"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[None, :]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def top_k(scores, k):
+    """
+    Select the k highest scores of every row, best first
+
+    Uses argpartition so only the selected k entries are fully sorted.
+
+    Returns:
+        tuple: (indices, scores), both of shape (num_rows, k)
+    """
+    k = min(k, scores.shape[1])
+    if k == 0:
+        empty = np.empty((scores.shape[0], 0))
+        return empty.astype(np.int64), empty.astype(np.float32)
+    if k < scores.shape[1]:
+        candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        candidates = np.tile(np.arange(scores.shape[1]), (scores.shape[0], 1))
+    candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+    order = np.argsort(-candidate_scores, axis=1, kind="stable")
+    return (np.take_along_axis(candidates, order, axis=1),
+            np.take_along_axis(candidate_scores, order, axis=1))
+
+
+def mmr_select(query_vector, candidate_vectors, k, lambda_mult=0.5):
+    """
+    Pick k candidates by maximal marginal relevance
+
+    Each step takes the candidate maximizing
+    lambda_mult * sim(query, c) - (1 - lambda_mult) * max sim(c, selected),
+    so a near-copy of an already selected chunk loses to a slightly less
+    relevant but different one. Relevance is one matrix-vector product over
+    the pool, and the redundancy term is a running maximum updated with the
+    similarity row of each newly selected candidate, so selection costs
+    O(k * pool * dim) instead of recomputing similarities to the whole
+    selected set at every step.
+
+    Args:
+        query_vector: Query embedding of shape (dim,)
+        candidate_vectors: Candidate embeddings of shape (pool, dim)
+        k: Number of candidates to select
+        lambda_mult: 1 for pure relevance, 0 for pure diversity
+
+    Returns:
+        list: Indices of the selected candidates, in selection order
+    """
+    candidates = normalize_rows(candidate_vectors)
+    k = min(k, len(candidates))
+    if k == 0:
+        return []
+    relevance = candidates @ normalize_rows(query_vector)[0]
+
+    selected = [int(np.argmax(relevance))]
+    redundancy = candidates @ candidates[selected[0]]
+    available = np.ones(len(candidates), dtype=bool)
+    available[selected[0]] = False
+    while len(selected) < k:
+        scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        np.maximum(redundancy, candidates @ candidates[best], out=redundancy)
+    return selected
+
+
+class NumpyVectorStoreRetriever(VectorStoreRetriever):
+    """Retriever that answers batches of similarity queries with one matrix product"""
+
+    def batch(self, inputs, config=None, *, return_exceptions=False, **kwargs):
+        if kwargs:
+            return super().batch(inputs, config, return_exceptions=return_exceptions, **kwargs)
+        if self.search_type == "mmr":
+            return self.vectorstore.batch_max_marginal_relevance_search(inputs, **self.search_kwargs)
+        if self.search_type != "similarity":
+            return super().batch(inputs, config, return_exceptions=return_exceptions, **kwargs)
+        results = self.vectorstore.batch_similarity_search_with_score(inputs, **self.search_kwargs)
+        return [[doc for doc, _ in docs_and_scores] for docs_and_scores in results]
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    In-memory exact vector index backed by a contiguous NumPy matrix
+
+    A lightweight alternative to Chroma for small and medium corpora. Embeddings
+    are normalized and kept in one float32 (or float16, to halve memory)
+    matrix, and top-k search is a vectorized dot product followed by
+    argpartition, for single queries as well as batches of queries.
+
+    Args:
+        embedding: Embeddings model used for documents and queries
+        dtype: Storage type of the matrix, "float32" or "float16"
+    """
+
+    def __init__(self, embedding, dtype="float32"):
+        self._embedding = embedding
+        self.dtype = np.dtype(dtype)
+        self._matrix = None
+        self._size = 0
+        self._documents = []
+        self._ids = []
+        self._row_by_id = {}
+        # Incremented on every change, so caches can tell when results are stale
+        self.version = 0
+
+    @property
+    def embeddings(self):
+        return self._embedding
+
+    @property
+    def matrix(self):
+        """The normalized embedding matrix, one row per document"""
+        if self._matrix is None:
+            return np.empty((0, 0), dtype=self.dtype)
+        return self._matrix[:self._size]
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def _id_to_row(self):
+        """Mapping from document ID to matrix row, built on first use after a snapshot is opened"""
+        if self._row_by_id is None:
+            self._row_by_id = {self._ids[row]: row for row in range(len(self._ids))}
+        return self._row_by_id
+
+    def _attach(self, matrix, ids, documents):
+        """Use existing (possibly memory-mapped, read-only) storage as the index contents"""
+        self._matrix = matrix if len(matrix) else None
+        self._size = len(matrix)
+        self._ids = ids
+        self._documents = documents
+        self._row_by_id = None
+
+    def _materialize(self):
+        """Copy snapshot-backed IDs and documents into lists before the index is modified"""
+        if not isinstance(self._documents, list):
+            self._documents = [self._documents[row] for row in range(len(self._documents))]
+            self._ids = [self._ids[row] for row in range(len(self._ids))]
+
+    def _append_rows(self, vectors):
+        """Append rows to the matrix, growing its capacity geometrically"""
+        if self._matrix is None:
+            self._matrix = np.empty((max(len(vectors), 16), vectors.shape[1]), dtype=self.dtype)
+        elif vectors.shape[1] != self._matrix.shape[1]:
+            raise ValueError(
+                f"Embedding dimension {vectors.shape[1]} does not match index dimension {self._matrix.shape[1]}"
+            )
+        needed = self._size + len(vectors)
+        if needed > len(self._matrix):
+            grown = np.empty((max(needed, 2 * len(self._matrix)), self._matrix.shape[1]), dtype=self.dtype)
+            grown[:self._size] = self._matrix[:self._size]
+            self._matrix = grown
+        self._matrix[self._size:needed] = vectors
+        self._size = needed
+
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs):
+        texts = list(texts)
+        vectors = self._embedding.embed_documents(texts)
+        return self.add_embeddings(texts, vectors, metadatas=metadatas, ids=ids)
+
+    def add_documents(self, documents, **kwargs):
+        ids = kwargs.pop("ids", None)
+        if ids is None and any(doc.id for doc in documents):
+            ids = [doc.id or str(uuid.uuid4()) for doc in documents]
+        return self.add_texts(
+            [doc.page_content for doc in documents],
+            metadatas=[doc.metadata for doc in documents],
+            ids=ids
+        )
+
+    def add_embeddings(self, texts, embeddings, metadatas=None, ids=None):
+        """
+        Add texts with precomputed embeddings, replacing documents with the same ID
+
+        Returns:
+            list: IDs of the added documents
+        """
+        texts = list(texts)
+        if not texts:
+            return []
+        self._materialize()
+        ids = list(ids) if ids is not None else [str(uuid.uuid4()) for _ in texts]
+        metadatas = list(metadatas) if metadatas is not None else [{} for _ in texts]
+
+        existing = [doc_id for doc_id in ids if doc_id in self._id_to_row]
+        if existing:
+            self.delete(existing)
+
+        self._append_rows(normalize_rows(embeddings))
+        for doc_id, text, metadata in zip(ids, texts, metadatas):
+            self._id_to_row[doc_id] = len(self._ids)
+            self._ids.append(doc_id)
+            self._documents.append(Document(id=doc_id, page_content=text, metadata=dict(metadata or {})))
+        self.version += 1
+        return ids
+
+    def delete(self, ids=None, **kwargs):
+        """Delete documents by ID, compacting the matrix"""
+        self._materialize()
+        if ids is None:
+            self._matrix, self._size = None, 0
+            self._documents, self._ids, self._row_by_id = [], [], {}
+            self._rows_removed(None)
+        else:
+            rows = {self._id_to_row[doc_id] for doc_id in ids if doc_id in self._id_to_row}
+            if not rows:
+                return True
+            keep = np.array([row not in rows for row in range(self._size)], dtype=bool)
+            self._matrix = np.ascontiguousarray(self.matrix[keep])
+            self._size = len(self._matrix)
+            self._documents = [doc for doc, kept in zip(self._documents, keep) if kept]
+            self._ids = [doc_id for doc_id, kept in zip(self._ids, keep) if kept]
+            self._row_by_id = {doc_id: row for row, doc_id in enumerate(self._ids)}
+            self._rows_removed(keep)
+        self.version += 1
+        return True
+
+    def _rows_removed(self, keep):
+        """Called after rows were deleted, with the boolean mask of kept rows (None if all were)"""
+
+    def get_by_ids(self, ids):
+        return [self._documents[self._id_to_row[doc_id]] for doc_id in ids if doc_id in self._id_to_row]
+
+    def _embed_queries(self, queries):
+        """Embed several queries at once when the embeddings model supports it"""
+        embed_queries = getattr(self._embedding, "embed_queries", None)
+        if embed_queries is not None:
+            return embed_queries(list(queries))
+        return [self._embedding.embed_query(query) for query in queries]
+
+    def _scores(self, queries):
+        """Cosine similarity of every (normalized) query against every row"""
+        matrix = self.matrix
+        if matrix.dtype == np.float32:
+            return queries @ matrix.T
+        # Score float16 storage in blocks to avoid a full float32 copy of the matrix
+        scores = np.empty((len(queries), len(matrix)), dtype=np.float32)
+        for start in range(0, len(matrix), _SCORE_BLOCK_ROWS):
+            block = matrix[start:start + _SCORE_BLOCK_ROWS].astype(np.float32)
+            scores[:, start:start + len(block)] = queries @ block.T
+        return scores
+
+    def _search(self, queries, k):
+        """
+        Find the k best rows for every query
+
+        Args:
+            queries: Normalized query matrix of shape (num_queries, dim)
+            k: Number of results per query
+
+        Returns:
+            tuple: (indices, scores), both of shape (num_queries, k)
+        """
+        if self._size == 0:
+            empty = np.empty((len(queries), 0))
+            return empty.astype(np.int64), empty.astype(np.float32)
+        return top_k(self._scores(queries), k)
+
+    def _results(self, indices, scores):
+        return [(self._documents[row], float(score)) for row, score in zip(indices, scores)]
+
+    def batch_similarity_search_with_score_by_vector(self, embeddings, k=4, **kwargs):
+        """Search many query vectors at once, returning a list of (document, score) lists"""
+        indices, scores = self._search(normalize_rows(embeddings), k)
+        return [self._results(row_indices, row_scores) for row_indices, row_scores in zip(indices, scores)]
+
+    def batch_similarity_search_with_score(self, queries, k=4, **kwargs):
+        """Embed and search many queries at once, returning a list of (document, score) lists"""
+        queries = list(queries)
+        if not queries:
+            return []
+        return self.batch_similarity_search_with_score_by_vector(self._embed_queries(queries), k=k)
+
+    def similarity_search_with_score_by_vector(self, embedding, k=4, **kwargs):
+        return self.batch_similarity_search_with_score_by_vector([embedding], k=k)[0]
+
+    def similarity_search_by_vector(self, embedding, k=4, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k=k)]
+
+    def similarity_search_with_score(self, query, k=4, **kwargs):
+        return self.similarity_search_with_score_by_vector(self._embedding.embed_query(query), k=k)
+
+    def similarity_search(self, query, k=4, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k)]
+
+    def batch_max_marginal_relevance_search_by_vector(self, embeddings, k=4, fetch_k=20, lambda_mult=0.5, **kwargs):
+        """
+        Re-rank the fetch_k nearest rows of every query vector by maximal marginal relevance
+
+        The candidate pools of all queries come from one batched search, and
+        each pool is re-ranked with mmr_select() on its rows of the matrix.
+        """
+        queries = normalize_rows(embeddings)
+        indices, _ = self._search(queries, max(k, fetch_k))
+        matrix = self.matrix
+        results = []
+        for query, pool in zip(queries, indices):
+            # Approximate indexes pad short result rows with -1
+            pool = pool[pool >= 0]
+            chosen = mmr_select(query, np.asarray(matrix[pool], dtype=np.float32), min(k, len(pool)), lambda_mult)
+            results.append([self._documents[pool[i]] for i in chosen])
+        return results
+
+    def batch_max_marginal_relevance_search(self, queries, k=4, fetch_k=20, lambda_mult=0.5, **kwargs):
+        """Embed many queries at once and return their maximal marginal relevance results"""
+        queries = list(queries)
+        if not queries:
+            return []
+        return self.batch_max_marginal_relevance_search_by_vector(
+            self._embed_queries(queries), k=k, fetch_k=fetch_k, lambda_mult=lambda_mult
+        )
+
+    def max_marginal_relevance_search_by_vector(self, embedding, k=4, fetch_k=20, lambda_mult=0.5, **kwargs):
+        return self.batch_max_marginal_relevance_search_by_vector(
+            [embedding], k=k, fetch_k=fetch_k, lambda_mult=lambda_mult
+        )[0]
+
+    def max_marginal_relevance_search(self, query, k=4, fetch_k=20, lambda_mult=0.5, **kwargs):
+        return self.max_marginal_relevance_search_by_vector(
+            self._embedding.embed_query(query), k=k, fetch_k=fetch_k, lambda_mult=lambda_mult
+        )
+
+    def _select_relevance_score_fn(self):
+        # Scores are already cosine similarities, higher is more relevant
+        return lambda score: score
+
+    def as_retriever(self, **kwargs):
+        tags = kwargs.pop("tags", None) or [*self._get_retriever_tags()]
+        return NumpyVectorStoreRetriever(vectorstore=self, tags=tags, **kwargs)
+
+    def _index_params(self):
+        """Constructor arguments written by save(), extended by subclasses"""
+        return {'dtype': self.dtype.name}
+
+    def _index_arrays(self):
+        """Extra arrays written by save(), overridden by subclasses with index structures"""
+        return {}
+
+    def _restore_index_arrays(self, arrays):
+        """Restore the arrays returned by _index_arrays() after load()"""
+
+    def save(self, path):
+        """
+        Write the index to a single snapshot file (see index_snapshot.py)
+
+        The file holds the embedding matrix, chunk texts and metadata and any
+        index structures, and can be opened again with load() without
+        re-reading, re-splitting or re-embedding the corpus.
+        """
+        save_store_snapshot(self, path)
+
+    @classmethod
+    def load(cls, path, embedding):
+        """
+        Open a snapshot written by save() through memory mapping
+
+        Nothing is copied into RAM up front: the matrix is read page by page
+        as it is searched, documents are decoded only when returned, and
+        several processes opening the same snapshot share its pages.
+        """
+        return load_store_snapshot(cls, path, embedding)
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, ids=None, dtype="float32", **kwargs):
+        store = cls(embedding, dtype=dtype)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
+
+
+class RescoringVectorStore(NumpyVectorStore):
+    """
+    Base class for indexes that scan a cheap representation and rescore a shortlist
+
+    Subclasses implement _approximate_scores(). Search keeps the best
+    k * rescore_factor rows by approximate score and rescores only those
+    rows with the full-precision matrix.
+
+    Args:
+        embedding: Embeddings model used for documents and queries
+        rescore_factor: Shortlist size as a multiple of k (1 disables rescoring)
+        dtype: Storage type of the full-precision matrix
+    """
+
+    def __init__(self, embedding, rescore_factor=4, dtype="float32"):
+        super().__init__(embedding, dtype=dtype)
+        self.rescore_factor = rescore_factor
+
+    def _approximate_scores(self, queries):
+        """Return approximate scores of shape (num_queries, num_rows)"""
+        raise NotImplementedError
+
+    def _search(self, queries, k):
+        if self._size == 0:
+            return super()._search(queries, k)
+
+        shortlist, approximate = top_k(self._approximate_scores(queries), k * self.rescore_factor)
+        if self.rescore_factor <= 1:
+            return shortlist, approximate
+
+        # Rescore the shortlist with the full-precision vectors
+        matrix = self.matrix
+        exact = np.stack([
+            np.asarray(matrix[rows], dtype=np.float32) @ query for rows, query in zip(shortlist, queries)
+        ])
+        best, scores = top_k(exact, k)
+        return np.take_along_axis(shortlist, best, axis=1), scores
+
+    def _index_params(self):
+        return {**super()._index_params(), 'rescore_factor': self.rescore_factor}
@@ -0,0 +1,163 @@
+import argparse
+import itertools
+import json
+import time
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from benchmark_utils import STORY_PATH, load_qa_pairs, load_splits, make_benchmark_embeddings
+from bm25_retriever import iter_store_documents
+from context_assembly import assemble_context
+from embedding_cache import CachedEmbeddings
+from numpy_vector_store import NumpyVectorStore
+from prompts import SYSTEM_PROMPT
+from retrieval_eval import RETRIEVAL_QA_PATH, evaluate_retrieval
+from tokens import count_tokens
+
+
+def index_bytes(vector_store):
+    """Bytes held by an in-process index: the embedding matrix plus the chunk texts"""
+    text_bytes = sum(len(doc.page_content.encode("utf-8")) for doc in iter_store_documents(vector_store))
+    return vector_store.matrix.nbytes + text_bytes
+
+
+class CountingEmbeddings(Embeddings):
+    """Pass-through embeddings that count the texts sent to embed_documents"""
+
+    def __init__(self, embeddings):
+        self.embeddings = embeddings
+        self.texts = 0
+
+    @property
+    def model(self):
+        return getattr(self.embeddings, "model", None)
+
+    @property
+    def dimensions(self):
+        return getattr(self.embeddings, "dimensions", None)
+
+    def embed_documents(self, texts):
+        self.texts += len(texts)
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text):
+        return self.embeddings.embed_query(text)
+
+
+def prompt_tokens(docs, question):
+    """Tokens of the prompt answer_question would send for these chunks"""
+    context, _ = assemble_context(docs)
+    return count_tokens(SYSTEM_PROMPT.format(context=context)) + count_tokens(question)
+
+
+def sweep_parameters(embeddings, qa_pairs, corpus_path=STORY_PATH, chunk_sizes=(500, 1000, 1500),
+                     chunk_overlaps=(0, 100, 200), k_values=(1, 2, 4), min_coverage=0.5):
+    """
+    Build one index per (chunk size, overlap) and evaluate it at every k
+
+    Indexes are built through the same embeddings object, so with the
+    on-disk cache of make_benchmark_embeddings() a chunk that occurs in
+    several configurations (and every question) is embedded only once.
+    texts_embedded counts the chunks that actually reached the embedding
+    model, below the cache if there is one. Prompt tokens are those of the
+    full prompt (system prompt, assembled context and question).
+    Combinations whose overlap is not smaller than the chunk size are skipped.
+
+    Returns:
+        list: One result dict per (chunk size, overlap, k)
+    """
+    # Count below the cache, so cache hits do not count as embedded texts
+    if isinstance(embeddings, CachedEmbeddings):
+        counter = CountingEmbeddings(embeddings.embeddings)
+        embeddings.embeddings = counter
+        try:
+            return _sweep(embeddings, counter, qa_pairs, corpus_path, chunk_sizes, chunk_overlaps, k_values,
+                          min_coverage)
+        finally:
+            embeddings.embeddings = counter.embeddings
+    counter = CountingEmbeddings(embeddings)
+    return _sweep(counter, counter, qa_pairs, corpus_path, chunk_sizes, chunk_overlaps, k_values, min_coverage)
+
+
+def _sweep(embeddings, counter, qa_pairs, corpus_path, chunk_sizes, chunk_overlaps, k_values, min_coverage):
+    results = []
+    for chunk_size, chunk_overlap in itertools.product(chunk_sizes, chunk_overlaps):
+        if chunk_overlap >= chunk_size:
+            continue
+        texts_before = counter.texts
+        start = time.perf_counter()
+        splits = load_splits(corpus_path, chunk_size, chunk_overlap)
+        vector_store = NumpyVectorStore(embeddings)
+        vector_store.add_documents(splits)
+        ingest_seconds = time.perf_counter() - start
+        embedded = counter.texts - texts_before
+        documents = list(iter_store_documents(vector_store))
+
+        for k in k_values:
+            retrieved = []
+
+            def search(question):
+                docs = vector_store.similarity_search(question, k=k)
+                retrieved.append((docs, question))
+                return docs
+
+            report = evaluate_retrieval(search, qa_pairs, documents, (k,), min_coverage)
+            # Counted after the timed searches, so latency is retrieval only
+            tokens = [prompt_tokens(docs, question) for docs, question in retrieved]
+            results.append({
+                'chunk_size': chunk_size,
+                'chunk_overlap': chunk_overlap,
+                'k': k,
+                'chunks': len(splits),
+                'index_bytes': index_bytes(vector_store),
+                'ingest_seconds': ingest_seconds,
+                'texts_embedded': embedded,
+                'latency': report['latency'],
+                'prompt_tokens': float(np.mean(tokens)) if tokens else 0.0,
+                'recall': report['recall'][k],
+                'answer_coverage': report['answer_coverage'][k],
+                'mrr': report['mrr'],
+            })
+    return results
+
+
+def print_sweep_report(results):
+    """Print one row per configuration, best recall first"""
+    print("\n=== Chunking / Retrieval Parameter Sweep ===")
+    print(f"{'size':>5} {'overlap':>7} {'k':>3} {'chunks':>6} {'index KB':>9} {'ingest s':>8} {'embedded':>8} "
+          f"{'p50 ms':>7} {'p95 ms':>7} {'tokens':>7} {'recall':>6} {'cover':>6} {'mrr':>6}")
+    ranked = sorted(results, key=lambda r: (-r['recall'], -r['answer_coverage'], r['prompt_tokens']))
+    for r in ranked:
+        print(f"{r['chunk_size']:>5} {r['chunk_overlap']:>7} {r['k']:>3} {r['chunks']:>6} "
+              f"{r['index_bytes'] / 1024:>9.1f} {r['ingest_seconds']:>8.2f} {r['texts_embedded']:>8} "
+              f"{r['latency']['p50_ms']:>7.2f} {r['latency']['p95_ms']:>7.2f} {r['prompt_tokens']:>7.0f} "
+              f"{r['recall']:>6.3f} {r['answer_coverage']:>6.3f} {r['mrr']:>6.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep chunk size, chunk overlap and k on the QA pairs")
+    parser.add_argument("--fake", action="store_true", help="Use local fake embeddings instead of OpenAI")
+    parser.add_argument("--corpus", default=STORY_PATH, help="Text file to index")
+    parser.add_argument("--qa", default=RETRIEVAL_QA_PATH, help="YAML file of QA pairs")
+    parser.add_argument("--chunk-sizes", type=int, nargs="+", default=[500, 1000, 1500])
+    parser.add_argument("--chunk-overlaps", type=int, nargs="+", default=[0, 100, 200])
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 2, 4], help="Numbers of chunks to retrieve")
+    parser.add_argument("--output", help="Optional JSON file for the full results")
+    args = parser.parse_args()
+
+    embeddings = make_benchmark_embeddings(fake=args.fake)
+    qa_pairs = load_qa_pairs([args.qa])
+    results = sweep_parameters(
+        embeddings, qa_pairs, args.corpus, args.chunk_sizes, args.chunk_overlaps, args.k
+    )
+    print(f"{len(qa_pairs)} questions, {len(results)} configurations")
+    print_sweep_report(results)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+import argparse
+import os
+import tempfile
+import uuid
+
+import numpy as np
+
+from benchmark_utils import STORY_PATH, load_qa_pairs, load_splits, make_benchmark_embeddings
+from numpy_vector_store import NumpyVectorStore, RescoringVectorStore, normalize_rows
+
+# Rows decoded at a time when scoring int8 codes
+_SCORE_BLOCK_ROWS = 65536
+# Number of set bits of every byte value, for numpy versions without bitwise_count
+_POPCOUNT_TABLE = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1).astype(np.uint8)
+
+
+def popcount(values):
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(values)
+    return _POPCOUNT_TABLE[values]
+
+
+def quantize_int8(vectors):
+    """
+    Quantize rows to int8 with one scale per row
+
+    Returns:
+        tuple: (codes, scales) with vectors ~= codes * scales[:, None]
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def quantize_binary(vectors):
+    """Keep only the sign of every dimension, packed 8 dimensions per byte"""
+    return np.packbits(np.asarray(vectors) > 0, axis=1)
+
+
+class QuantizedVectorStore(RescoringVectorStore):
+    """
+    Vector index that searches compact codes and rescores a shortlist
+
+    Every vector is also stored as int8 codes (4x smaller than float32) or
+    binary sign codes (32x smaller). Search scores all rows on the codes,
+    keeps the best k * rescore_factor rows, and rescores only that shortlist
+    with the full-precision vectors. A store built in memory keeps both the
+    codes and the full-precision matrix, so it uses more RAM than an exact
+    index; the memory saving comes from a memory-mapped snapshot (save() and
+    load()), where the full-precision matrix stays on disk and only the
+    shortlisted rows are paged in.
+
+    Args:
+        embedding: Embeddings model used for documents and queries
+        quantization: "int8" or "binary"
+        rescore_factor: Shortlist size as a multiple of k (1 disables rescoring)
+        dtype: Storage type of the full-precision matrix
+    """
+
+    def __init__(self, embedding, quantization="int8", rescore_factor=4, dtype="float32"):
+        if quantization not in ("int8", "binary"):
+            raise ValueError(f"Unknown quantization: {quantization}")
+        super().__init__(embedding, rescore_factor=rescore_factor, dtype=dtype)
+        self.quantization = quantization
+        self._codes = None
+        self._scales = None
+
+    def _append_rows(self, vectors):
+        super()._append_rows(vectors)
+        if self.quantization == "int8":
+            codes, scales = quantize_int8(vectors)
+            self._scales = scales if self._scales is None else np.concatenate((self._scales, scales))
+        else:
+            codes = quantize_binary(vectors)
+        self._codes = codes if self._codes is None else np.concatenate((self._codes, codes))
+
+    def _rows_removed(self, keep):
+        if keep is None:
+            self._codes, self._scales = None, None
+            return
+        self._codes = self._codes[keep]
+        if self._scales is not None:
+            self._scales = self._scales[keep]
+
+    @property
+    def code_bytes(self):
+        """Bytes of the codes that are scanned on every query"""
+        if self._codes is None:
+            return 0
+        return self._codes.nbytes + (self._scales.nbytes if self._scales is not None else 0)
+
+    def _approximate_scores(self, queries):
+        """Score every row against the queries using only the codes"""
+        if self.quantization == "binary":
+            query_bits = quantize_binary(queries)
+            dim = queries.shape[1]
+            scores = np.empty((len(queries), len(self._codes)), dtype=np.float32)
+            for i, bits in enumerate(query_bits):
+                hamming = popcount(np.bitwise_xor(self._codes, bits)).sum(axis=1, dtype=np.int32)
+                # Fraction of matching signs minus fraction of differing signs, in [-1, 1]
+                scores[i] = 1 - 2 * hamming / dim
+            return scores
+
+        scores = np.empty((len(queries), len(self._codes)), dtype=np.float32)
+        for start in range(0, len(self._codes), _SCORE_BLOCK_ROWS):
+            block = self._codes[start:start + _SCORE_BLOCK_ROWS].astype(np.float32)
+            scales = self._scales[start:start + len(block)]
+            scores[:, start:start + len(block)] = (queries @ block.T) * scales
+        return scores
+
+    def _index_params(self):
+        return {
+            **super()._index_params(),
+            'quantization': self.quantization,
+        }
+
+    def _index_arrays(self):
+        if self._codes is None:
+            return {}
+        arrays = {'codes': self._codes}
+        if self._scales is not None:
+            arrays['scales'] = self._scales
+        return arrays
+
+    def _restore_index_arrays(self, arrays):
+        self._codes = arrays.get('codes')
+        self._scales = arrays.get('scales')
+
+
+def chroma_search_rows(embeddings, texts, vectors, query_vectors, k):
+    """
+    Rows of the top k chunks a Chroma collection returns per query
+
+    Chroma is the default backend of create_rag_system, so this is the
+    retriever a quantized index would replace. The vectors are upserted
+    directly, nothing is embedded again.
+    """
+    from langchain_chroma import Chroma
+
+    store = Chroma(collection_name=f"quantized_benchmark_{uuid.uuid4().hex}", embedding_function=embeddings)
+    try:
+        store._collection.upsert(
+            ids=[str(row) for row in range(len(texts))],
+            embeddings=normalize_rows(vectors).tolist(),
+            documents=texts
+        )
+        return [[int(doc.id) for doc in store.similarity_search_by_vector(vector.tolist(), k=k)]
+                for vector in query_vectors]
+    finally:
+        store.delete_collection()
+
+
+def _recall(indices, expected_indices, k_values, num_rows):
+    recall = {}
+    for k in k_values:
+        hits = sum(len(set(found[:k]) & set(expected[:k])) for found, expected in zip(indices, expected_indices))
+        recall[k] = hits / (len(expected_indices) * min(k, num_rows))
+    return recall
+
+
+def benchmark_quantization(embeddings, splits, questions, k_values=(2, 5), rescore_factors=(1, 4)):
+    """
+    Compare quantized search with the exact and the Chroma retriever on a set of questions
+
+    Each quantized store is saved to a snapshot and searched after reopening
+    it memory-mapped, the setup in which quantization saves memory.
+
+    Returns:
+        list: One result per (quantization, rescore_factor) with recall@k against
+        exact search, chroma_recall@k against the Chroma retriever (None when
+        langchain_chroma is not installed), in_memory_bytes (codes plus
+        full-precision matrix of a store built in RAM) and snapshot_bytes (codes
+        scanned per query when the full-precision matrix stays on disk in a
+        memory-mapped snapshot)
+    """
+    texts = [split.page_content for split in splits]
+    vectors = embeddings.embed_documents(texts)
+    query_vectors = normalize_rows(embeddings.embed_documents(questions))
+    max_k = max(k_values)
+
+    exact = NumpyVectorStore(embeddings)
+    exact.add_embeddings(texts, vectors)
+    exact_indices, _ = exact._search(query_vectors, max_k)
+    float32_bytes = exact.matrix.size * 4
+    try:
+        chroma_indices = chroma_search_rows(embeddings, texts, vectors, query_vectors, max_k)
+    except ImportError:
+        chroma_indices = None
+
+    def chroma_recall(indices):
+        if chroma_indices is None:
+            return None
+        return _recall(indices, chroma_indices, k_values, len(texts))
+
+    results = [{
+        'quantization': "float32",
+        'rescore_factor': None,
+        'in_memory_bytes': float32_bytes,
+        'snapshot_bytes': float32_bytes,
+        'memory_saved': 0.0,
+        'recall': {k: 1.0 for k in k_values},
+        'chroma_recall': chroma_recall(exact_indices),
+    }]
+    with tempfile.TemporaryDirectory(prefix="quantized_snapshots_") as snapshot_dir:
+        for quantization in ("int8", "binary"):
+            for rescore_factor in rescore_factors:
+                store = QuantizedVectorStore(embeddings, quantization=quantization, rescore_factor=rescore_factor)
+                store.add_embeddings(texts, vectors)
+                in_memory_bytes = store.code_bytes + store.matrix.nbytes
+                snapshot_path = os.path.join(snapshot_dir, f"{quantization}_x{rescore_factor}.snapshot")
+                store.save(snapshot_path)
+                store = QuantizedVectorStore.load(snapshot_path, embeddings)
+                indices, _ = store._search(query_vectors, max_k)
+                results.append({
+                    'quantization': quantization,
+                    'rescore_factor': rescore_factor,
+                    'in_memory_bytes': in_memory_bytes,
+                    'snapshot_bytes': store.code_bytes,
+                    'memory_saved': 1 - store.code_bytes / float32_bytes,
+                    'recall': _recall(indices, exact_indices, k_values, len(texts)),
+                    'chroma_recall': chroma_recall(indices),
+                })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark quantized retrieval on the QA pairs")
+    parser.add_argument("--fake", action="store_true", help="Use local fake embeddings instead of OpenAI")
+    parser.add_argument("--corpus", default=STORY_PATH, help="Text file to index")
+    args = parser.parse_args()
+
+    embeddings = make_benchmark_embeddings(fake=args.fake)
+    splits = load_splits(args.corpus)
+    questions = [qa_pair['question'] for qa_pair in load_qa_pairs()]
+    results = benchmark_quantization(embeddings, splits, questions)
+
+    print("\n=== Quantized Retrieval vs Exact and Chroma Retrievers ===")
+    print(f"{len(splits)} chunks, {len(questions)} questions")
+    for result in results:
+        rescore = "-" if result['rescore_factor'] is None else f"x{result['rescore_factor']}"
+        recall = "  ".join(f"recall@{k}={value:.3f}" for k, value in result['recall'].items())
+        if result['chroma_recall'] is not None:
+            recall += "  " + "  ".join(f"chroma@{k}={value:.3f}" for k, value in result['chroma_recall'].items())
+        print(f"{result['quantization']:<8} rescore={rescore:<3} {result['in_memory_bytes']:>10} bytes in RAM  "
+              f"{result['snapshot_bytes']:>10} bytes scanned from snapshot "
+              f"(saved {result['memory_saved']:.1%})  {recall}")
+    if results[0]['chroma_recall'] is None:
+        print("langchain_chroma is not installed, so recall against the Chroma retriever was skipped.")
+    print("Stores built in RAM keep the float32 matrix next to the codes; "
+          "the saving applies to memory-mapped snapshots.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+import threading
+from collections import OrderedDict
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+
+_MISSING = object()
+
+
+def normalize_question(text):
+    """Canonical form of a question: case-folded with whitespace collapsed"""
+    return " ".join(text.split()).casefold()
+
+
+def index_version(index):
+    """
+    Return a value that changes whenever the index contents change
+
+    In-process indexes (NumPy-backed stores, BM25Index) count their
+    mutations in a version attribute. Chroma has no such counter, so its
+    version is the collection size together with the writes recorded by
+    record_index_write(): a replace that deletes one chunk and adds another
+    leaves the size unchanged but still bumps the write count.
+    """
+    version = getattr(index, "version", None)
+    if version is not None:
+        return version
+    collection = getattr(index, "_collection", None)
+    if collection is not None:
+        return collection.count(), getattr(index, "write_count", 0)
+    return None
+
+
+def record_index_write(index):
+    """
+    Count a write to a store that keeps no version of its own (Chroma)
+
+    Ingestion code calls this after every upsert, update or delete, so
+    index_version() changes even when the collection size does not.
+    In-process stores already count their own writes and are left alone.
+    """
+    if getattr(index, "version", None) is None:
+        index.write_count = getattr(index, "write_count", 0) + 1
+
+
+class LRUCache:
+    """Thread-safe bounded mapping that evicts the least recently used entry"""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Hit/miss counters, useful for sizing the cache
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._entries.get(key, _MISSING)
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Return cache counters as a dictionary"""
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'evictions': self.evictions,
+            'entries': len(self),
+            'max_entries': self.max_entries,
+        }
+
+
+class QueryEmbeddingCache(Embeddings):
+    """
+    Keep recent query embeddings in memory
+
+    Query vectors do not depend on the index, so they stay valid after the
+    index changes: a retrieval cache miss caused by re-ingestion still
+    skips the embedding round trip. Documents are passed through uncached.
+
+    Args:
+        embeddings: The embeddings object to wrap
+        max_entries: Maximum number of query vectors kept
+    """
+
+    def __init__(self, embeddings, max_entries=1024):
+        self.embeddings = embeddings
+        self.cache = LRUCache(max_entries)
+
+    @property
+    def model(self):
+        """Model name of the wrapped embeddings, so caches can be stacked"""
+        return getattr(self.embeddings, "model", None)
+
+    @property
+    def dimensions(self):
+        return getattr(self.embeddings, "dimensions", None)
+
+    def embed_documents(self, texts):
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text):
+        key = normalize_question(text)
+        vector = self.cache.get(key)
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self.cache.put(key, vector)
+        return list(vector)
+
+    def embed_queries(self, texts):
+        """Embed several queries, sending only the uncached ones in one batch"""
+        keys = [normalize_question(text) for text in texts]
+        vectors = {key: self.cache.get(key) for key in dict.fromkeys(keys)}
+        missing = [key for key, vector in vectors.items() if vector is None]
+        if missing:
+            first_text = dict(zip(reversed(keys), reversed(texts)))
+            missing_texts = [first_text[key] for key in missing]
+            embed_queries = getattr(self.embeddings, "embed_queries", None)
+            if embed_queries is not None:
+                new_vectors = embed_queries(missing_texts)
+            else:
+                new_vectors = [self.embeddings.embed_query(text) for text in missing_texts]
+            for key, vector in zip(missing, new_vectors):
+                self.cache.put(key, vector)
+                vectors[key] = vector
+        return [list(vectors[key]) for key in keys]
+
+    def stats(self):
+        return self.cache.stats()
+
+
+class CachedRetriever(BaseRetriever):
+    """
+    Serve repeated questions from an LRU cache of retrieval results
+
+    Results are keyed on the normalized question and the current version of
+    every index the wrapped retriever reads, so they are invalidated
+    automatically as soon as an index changes.
+
+    Args:
+        retriever: The retriever to wrap
+        indexes: Stores / indexes whose versions are part of the cache key
+        cache: LRUCache holding the results
+    """
+
+    retriever: BaseRetriever
+    indexes: list = []
+    cache: LRUCache
+
+    def _key(self, query):
+        return (normalize_question(query), tuple(index_version(index) for index in self.indexes))
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        key = self._key(query)
+        documents = self.cache.get(key)
+        if documents is None:
+            documents = self.retriever.invoke(query)
+            self.cache.put(key, documents)
+        return list(documents)
+
+    def batch(self, inputs, config=None, *, return_exceptions=False, **kwargs):
+        """Look up every query, then retrieve only the missing ones in one batch"""
+        inputs = list(inputs)
+        keys = [self._key(query) for query in inputs]
+        results = {key: self.cache.get(key) for key in dict.fromkeys(keys)}
+        missing = [key for key, documents in results.items() if documents is None]
+        if missing:
+            first_query = dict(zip(reversed(keys), reversed(inputs)))
+            retrieved = self.retriever.batch([first_query[key] for key in missing], config, **kwargs)
+            for key, documents in zip(missing, retrieved):
+                self.cache.put(key, documents)
+                results[key] = documents
+        return [list(results[key]) for key in keys]
+
+    def invalidate(self):
+        """Drop every cached result, e.g. after the index was changed in place"""
+        self.cache.clear()
+
+    def stats(self):
+        return self.cache.stats()
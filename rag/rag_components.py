@@ -0,0 +1,83 @@
+from adaptive_retriever import AdaptiveRetriever
+from bm25_retriever import BM25Index, BM25Retriever, HybridRetriever
+from ivf_vector_store import IVFVectorStore
+from matryoshka_vector_store import TruncatedVectorStore
+from numpy_vector_store import NumpyVectorStore
+from quantized_vector_store import QuantizedVectorStore
+from query_cache import CachedRetriever, LRUCache
+
+INDEX_BACKENDS = {
+    "numpy": NumpyVectorStore,
+    "ivf": IVFVectorStore,
+    "quantized": QuantizedVectorStore,
+    "matryoshka": TruncatedVectorStore,
+}
+
+
+def create_vector_store(embeddings, index_backend="chroma", persist_directory=None, index_dtype="float32",
+                        index_params=None):
+    """
+    Create an empty vector store for the selected index backend
+
+    Args:
+        embeddings: Embeddings model used by the store
+        index_backend: "chroma", or one of the in-process backends in INDEX_BACKENDS
+        persist_directory: Directory of a persisted Chroma collection
+        index_dtype: Storage type of in-process index matrices
+        index_params: Extra keyword arguments for the in-process index, e.g. {"n_probe": 16}
+    """
+    if index_backend == "chroma":
+        # Imported here, so the in-process backends and benchmarks work without Chroma
+        from langchain_chroma import Chroma
+
+        if persist_directory:
+            return Chroma(
+                collection_name="rag",
+                embedding_function=embeddings,
+                persist_directory=persist_directory
+            )
+        return Chroma(embedding_function=embeddings)
+    if index_backend in INDEX_BACKENDS:
+        if persist_directory:
+            raise ValueError(f"The {index_backend} index backend is in-memory and does not support persist_directory")
+        return INDEX_BACKENDS[index_backend](embeddings, dtype=index_dtype, **(index_params or {}))
+    raise ValueError(f"Unknown index backend: {index_backend}")
+
+
+def create_retriever(vector_store, retrieval_mode="dense", retrieval_params=None, query_cache_size=None):
+    """
+    Create the retriever used by create_rag_system on top of a populated vector store
+
+    Args:
+        vector_store: Vector store holding the ingested chunks
+        retrieval_mode: "dense", "bm25", "hybrid", "mmr" or "adaptive" (see create_rag_system)
+        retrieval_params: Extra retriever parameters for adaptive or mmr
+        query_cache_size: Optional number of questions whose retrieved chunks are kept in memory
+
+    Returns:
+        BaseRetriever: The retriever
+    """
+    if retrieval_mode == "dense":
+        retriever = vector_store.as_retriever(search_kwargs={"k": 2})
+    elif retrieval_mode in ("bm25", "hybrid"):
+        # Lexical index over the ingested chunks, so exact names and rare terms are matched.
+        # It re-reads the store whenever the store's version changes.
+        bm25_index = BM25Index.from_vector_store(vector_store)
+        print(f"Built BM25 index over {len(bm25_index)} chunks")
+        if retrieval_mode == "bm25":
+            retriever = BM25Retriever(index=bm25_index, k=2)
+        else:
+            retriever = HybridRetriever(vector_store=vector_store, index=bm25_index, k=2)
+    elif retrieval_mode == "mmr":
+        retriever = vector_store.as_retriever(
+            search_type="mmr",
+            search_kwargs={"k": 2, "fetch_k": 20, **(retrieval_params or {})}
+        )
+    elif retrieval_mode == "adaptive":
+        retriever = AdaptiveRetriever(vector_store=vector_store, **(retrieval_params or {}))
+    else:
+        raise ValueError(f"Unknown retrieval mode: {retrieval_mode}")
+    if query_cache_size:
+        retriever = CachedRetriever(retriever=retriever, indexes=[vector_store], cache=LRUCache(query_cache_size))
+
+    return retriever
@@ -0,0 +1,110 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Score columns kept next to each record so summaries are computed in SQL
+SCORE_COLUMNS = ('rouge1', 'rouge2', 'rougeL', 'factual_score')
+
+
+class ResultsStore:
+    """
+    Append-only SQLite store of per-question evaluation results
+
+    Every QA pair is written as soon as it is scored, so an interrupted run
+    loses at most the pairs in flight. Rerunning with the same run_id skips
+    the question IDs that are already stored. Records are read back one at
+    a time, so memory use does not grow with the size of the QA set.
+
+    Args:
+        path: Path of the SQLite file
+        run_id: Name of the evaluation run; results of different runs are kept apart
+    """
+
+    def __init__(self, path, run_id="default"):
+        self.path = path
+        self.run_id = run_id
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "run_id TEXT NOT NULL, question_id TEXT NOT NULL, category TEXT, "
+            + "".join(f"{column} REAL, " for column in SCORE_COLUMNS)
+            + "record TEXT NOT NULL, created REAL NOT NULL, PRIMARY KEY (run_id, question_id))"
+        )
+        self._conn.commit()
+
+    def is_done(self, question_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM results WHERE run_id = ? AND question_id = ?", (self.run_id, str(question_id))
+            ).fetchone()
+        return row is not None
+
+    def append(self, record):
+        """Store the result of one QA pair; a question that is already stored is left as it was"""
+        scores = {**record.get('rouge_scores', {}), 'factual_score': record.get('factual_score')}
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR IGNORE INTO results (run_id, question_id, category, {', '.join(SCORE_COLUMNS)}, "
+                f"record, created) VALUES (?, ?, ?, {', '.join('?' * len(SCORE_COLUMNS))}, ?, ?)",
+                (self.run_id, str(record['question_id']), record.get('category'),
+                 *(scores.get(column) for column in SCORE_COLUMNS), json.dumps(record), time.time())
+            )
+            self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM results WHERE run_id = ?", (self.run_id,)).fetchone()[0]
+
+    def iter_records(self, batch_size=256):
+        """Yield the stored records in insertion order without loading them all"""
+        last_rowid = 0
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT rowid, record FROM results WHERE run_id = ? AND rowid > ? ORDER BY rowid LIMIT ?",
+                    (self.run_id, last_rowid, batch_size)
+                ).fetchall()
+            if not rows:
+                return
+            for rowid, record in rows:
+                yield json.loads(record)
+            last_rowid = rows[-1][0]
+
+    def summary(self):
+        """Average scores over the run, overall and per category"""
+        averages = ", ".join(f"AVG({column})" for column in SCORE_COLUMNS)
+        with self._lock:
+            overall = self._conn.execute(
+                f"SELECT COUNT(*), {averages} FROM results WHERE run_id = ?", (self.run_id,)
+            ).fetchone()
+            by_category = self._conn.execute(
+                f"SELECT category, COUNT(*), {averages} FROM results WHERE run_id = ? GROUP BY category",
+                (self.run_id,)
+            ).fetchall()
+        return {
+            'questions': overall[0],
+            'scores': dict(zip(SCORE_COLUMNS, overall[1:])),
+            'categories': {
+                row[0]: {'questions': row[1], 'scores': dict(zip(SCORE_COLUMNS, row[2:]))} for row in by_category
+            },
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def print_results_summary(summary, run_id):
+    """Print the averages of a stored evaluation run"""
+    def format_scores(scores):
+        return "  ".join(f"{name}={value:.4f}" for name, value in scores.items() if value is not None)
+
+    print(f"\n=== Evaluation Run '{run_id}' ===")
+    print(f"Questions evaluated: {summary['questions']}")
+    print(f"Average scores: {format_scores(summary['scores'])}")
+    for category, values in sorted(summary['categories'].items(), key=lambda item: str(item[0])):
+        print(f"  {category} ({values['questions']}): {format_scores(values['scores'])}")
@@ -0,0 +1,171 @@
+import argparse
+import os
+import time
+
+from benchmark_utils import DATA_DIR, STORY_PATH, latency_summary, load_qa_pairs, load_splits, make_benchmark_embeddings
+from bm25_retriever import STOPWORDS, document_key, iter_store_documents
+from bulk_rouge import tokenize_text
+from rag_components import INDEX_BACKENDS, create_retriever, create_vector_store
+
+RETRIEVAL_QA_PATH = os.path.join(DATA_DIR, "qa_pairs.yaml")
+
+
+def content_terms(text):
+    """Stemmed words of a text without stopwords"""
+    return {token for token in tokenize_text(text) if token not in STOPWORDS}
+
+
+def answer_coverage(answer_terms, text):
+    """Fraction of the answer's content terms that occur in a text"""
+    if not answer_terms:
+        return 0.0
+    return len(answer_terms & content_terms(text)) / len(answer_terms)
+
+
+def label_supporting_chunks(answer, chunk_terms, min_coverage=0.5):
+    """
+    Find the chunks that support a ground-truth answer, without an LLM
+
+    A chunk supports the answer when it contains at least min_coverage of
+    the answer's content terms. If no chunk gets there, the chunks with the
+    highest coverage are used, so every answer has a target.
+
+    Args:
+        answer: Ground-truth answer
+        chunk_terms: {document_key: content terms of the chunk}
+        min_coverage: Share of answer terms a chunk needs to count as supporting
+
+    Returns:
+        set: Keys (see document_key) of the supporting chunks
+    """
+    terms = content_terms(answer)
+    if not terms:
+        return set()
+    coverage = {key: len(terms & chunk) / len(terms) for key, chunk in chunk_terms.items()}
+    supporting = {key for key, value in coverage.items() if value >= min_coverage}
+    if not supporting and coverage:
+        best = max(coverage.values())
+        supporting = {key for key, value in coverage.items() if value == best and value > 0}
+    return supporting
+
+
+def evaluate_retrieval(search, qa_pairs, documents, k_values=(1, 2, 5, 10), min_coverage=0.5):
+    """
+    Measure retrieval quality and latency on QA pairs, with no LLM calls
+
+    Args:
+        search: Function question -> ranked list of documents (at least max(k_values) long)
+        qa_pairs: QA pairs with 'question' and 'answer'
+        documents: All indexed chunks as stored (with their IDs), used to label the supporting chunks
+        k_values: Cut-offs reported for recall and answer coverage
+        min_coverage: Answer-term coverage for a chunk to count as supporting
+
+    Returns:
+        dict: recall@k (share of questions with a supporting chunk in the top k),
+        answer coverage@k (share of answer terms found in the top k), MRR,
+        mean number of chunks returned and per-query latency
+    """
+    chunk_terms = {document_key(doc): content_terms(doc.page_content) for doc in documents}
+    per_query, latencies = [], []
+    for qa_pair in qa_pairs:
+        supporting = label_supporting_chunks(qa_pair['answer'], chunk_terms, min_coverage)
+        start = time.perf_counter()
+        retrieved = search(qa_pair['question'])
+        latencies.append(time.perf_counter() - start)
+
+        keys = [document_key(doc) for doc in retrieved]
+        first_hit = next((rank for rank, key in enumerate(keys, 1) if key in supporting), None)
+        terms = content_terms(qa_pair['answer'])
+        per_query.append({
+            'id': qa_pair.get('id'),
+            'question': qa_pair['question'],
+            'supporting_chunks': len(supporting),
+            'first_hit_rank': first_hit,
+            'retrieved': len(retrieved),
+            'coverage': {
+                k: answer_coverage(terms, " ".join(doc.page_content for doc in retrieved[:k])) for k in k_values
+            },
+            'latency_ms': latencies[-1] * 1000,
+        })
+
+    num_queries = len(per_query) or 1
+    return {
+        'queries': len(per_query),
+        'recall': {
+            k: sum(1 for q in per_query if q['first_hit_rank'] and q['first_hit_rank'] <= k) / num_queries
+            for k in k_values
+        },
+        'answer_coverage': {k: sum(q['coverage'][k] for q in per_query) / num_queries for k in k_values},
+        'mrr': sum(1 / q['first_hit_rank'] for q in per_query if q['first_hit_rank']) / num_queries,
+        'mean_retrieved': sum(q['retrieved'] for q in per_query) / num_queries,
+        'latency': latency_summary(latencies),
+        'per_query': per_query,
+    }
+
+
+def print_retrieval_report(report, label="Retrieval Evaluation"):
+    """Print retrieval metrics"""
+    print(f"\n=== {label} ===")
+    print(f"Questions: {report['queries']}")
+    print("Recall@k:          " + "  ".join(f"@{k}={value:.3f}" for k, value in report['recall'].items()))
+    print("Answer coverage@k: " + "  ".join(f"@{k}={value:.3f}" for k, value in report['answer_coverage'].items()))
+    print(f"MRR: {report['mrr']:.3f}")
+    print(f"Mean chunks returned: {report['mean_retrieved']:.2f} (recall@k for larger k equals recall at this depth)")
+    latency = report['latency']
+    print(f"Latency: mean {latency['mean_ms']:.2f} ms, p50 {latency['p50_ms']:.2f} ms, "
+          f"p95 {latency['p95_ms']:.2f} ms, max {latency['max_ms']:.2f} ms")
+    for query in report['per_query']:
+        rank = query['first_hit_rank'] or "-"
+        print(f"  Q{query['id']}: first supporting chunk at rank {rank}, {query['latency_ms']:.2f} ms")
+
+
+def evaluate_retriever(retriever, qa_pairs, documents, k_values=(1, 2, 5, 10), min_coverage=0.5):
+    """
+    Evaluate a retriever object, e.g. one built by create_rag_system() or create_retriever()
+
+    Args:
+        retriever: Retriever to measure, called through invoke()
+        documents: Chunks of the index behind the retriever (see iter_store_documents)
+
+    Returns:
+        dict: See evaluate_retrieval()
+    """
+    return evaluate_retrieval(retriever.invoke, qa_pairs, documents, k_values, min_coverage)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate retrieval alone on the QA pairs, without LLM calls")
+    parser.add_argument("--fake", action="store_true", help="Use local fake embeddings instead of OpenAI")
+    parser.add_argument("--corpus", default=STORY_PATH, help="Text file to index")
+    parser.add_argument("--qa", default=RETRIEVAL_QA_PATH, help="YAML file of QA pairs")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--chunk-overlap", type=int, default=200)
+    parser.add_argument("--backend", default="numpy", choices=["chroma", *INDEX_BACKENDS],
+                        help="Index backend, as in create_rag_system")
+    parser.add_argument("--modes", nargs="+", default=["dense", "bm25", "hybrid", "mmr", "adaptive"],
+                        help="Retrieval modes to compare, as in create_rag_system")
+    parser.add_argument("--query-cache-size", type=int, default=None,
+                        help="Wrap the retrievers in the query cache, as in create_rag_system")
+    parser.add_argument("--min-coverage", type=float, default=0.5,
+                        help="Share of answer terms a chunk needs to count as supporting")
+    args = parser.parse_args()
+
+    embeddings = make_benchmark_embeddings(fake=args.fake)
+    splits = load_splits(args.corpus, args.chunk_size, args.chunk_overlap)
+    # Build the index and retrievers with the same code as create_rag_system
+    vector_store = create_vector_store(embeddings, args.backend)
+    vector_store.add_documents(splits)
+    documents = list(iter_store_documents(vector_store))
+    qa_pairs = load_qa_pairs([args.qa])
+    k_values = (1, 2, 5, 10)
+
+    print(f"{len(splits)} chunks (size {args.chunk_size}, overlap {args.chunk_overlap}) in a {args.backend} index, "
+          f"{len(qa_pairs)} questions")
+    for mode in args.modes:
+        retriever = create_retriever(vector_store, mode, query_cache_size=args.query_cache_size)
+        report = evaluate_retriever(retriever, qa_pairs, documents, k_values, args.min_coverage)
+        print_retrieval_report(report, f"Retrieval Evaluation: {args.backend} / {mode}")
+
+
+if __name__ == "__main__":
+    main()
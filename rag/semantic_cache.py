@@ -0,0 +1,213 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from bm25_retriever import iter_store_documents
+from cache_keys import llm_model_key, text_hash
+from embedding_cache import DEFAULT_CACHE_DIR, embedding_model_key
+from numpy_vector_store import normalize_rows
+
+
+def index_fingerprint(vector_store):
+    """Hash of every indexed chunk (text and metadata), the same for every build of the same corpus"""
+    digest = hashlib.sha256()
+    chunk_hashes = sorted(
+        text_hash(doc.page_content + "\0" + json.dumps(doc.metadata, sort_keys=True, default=str))
+        for doc in iter_store_documents(vector_store)
+    )
+    for chunk_hash in chunk_hashes:
+        digest.update(chunk_hash.encode("ascii"))
+    return digest.hexdigest()
+
+
+def answer_fingerprint(llm, prompt, vector_store):
+    """
+    Fingerprint of everything an answer depends on besides the question
+
+    Changes when the chat model, the prompt template or the indexed chunks
+    change, so answers produced under the old setup are not served.
+    """
+    return text_hash("\0".join((llm_model_key(llm), text_hash(prompt), index_fingerprint(vector_store))))
+
+
+class SemanticAnswerCache:
+    """
+    Reuse generated answers for questions that mean the same thing
+
+    Every answered question is stored with its embedding, answer, context
+    and the time it took to produce. A new question whose embedding has a
+    cosine similarity of at least threshold with a stored one gets the
+    stored answer and context back, skipping retrieval and the LLM call.
+
+    Entries live in a SQLite file, so the cache survives restarts, and the
+    normalized question vectors are kept in one in-memory matrix, so a
+    lookup is a single matrix-vector product. Entries older than
+    ttl_seconds are never served, and past max_entries the least recently
+    used ones are evicted.
+
+    Answers are only served under the fingerprint they were stored with
+    (see answer_fingerprint()), so re-indexing the corpus or changing the
+    LLM or the prompt starts from an empty cache instead of returning
+    stale answers.
+
+    Args:
+        embeddings: Embeddings model used for the questions
+        fingerprint: Fingerprint of the corpus, LLM and prompt, e.g. answer_fingerprint(llm,
+            SYSTEM_PROMPT, vector_store)
+        path: Path of the SQLite cache file
+        threshold: Minimum cosine similarity for a question to count as a paraphrase
+        ttl_seconds: Maximum age of a served answer (None for no limit)
+        max_entries: Maximum number of stored answers (None for no cap)
+    """
+
+    def __init__(self, embeddings, fingerprint, path=None, threshold=0.95, ttl_seconds=7 * 24 * 3600,
+                 max_entries=10_000):
+        self.embeddings = embeddings
+        self.fingerprint = fingerprint
+        # Stored in the model column: entries are only visible to the same embeddings and fingerprint
+        self.model_key = f"{embedding_model_key(embeddings)}:{fingerprint}"
+        self.path = path or os.path.join(DEFAULT_CACHE_DIR, "answers.sqlite")
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+
+        # Counters for sizing the cache and the threshold
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.lookup_seconds = 0.0
+        self.latency_saved_seconds = 0.0
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, model TEXT NOT NULL, question TEXT NOT NULL, "
+            "answer TEXT NOT NULL, context TEXT NOT NULL, vector BLOB NOT NULL, "
+            "latency REAL NOT NULL, created REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS answers_model ON answers (model)")
+        self._conn.commit()
+        with self._lock:
+            self._load()
+
+    def _load(self):
+        """Drop expired entries and read the question vectors of this model into memory"""
+        if self.ttl_seconds is not None:
+            deleted = self._conn.execute(
+                "DELETE FROM answers WHERE created < ?", (time.time() - self.ttl_seconds,)
+            ).rowcount
+            self.expirations += deleted
+        self._conn.commit()
+        rows = self._conn.execute(
+            "SELECT id, vector, created, latency FROM answers WHERE model = ? ORDER BY id", (self.model_key,)
+        ).fetchall()
+        self._ids = np.array([row[0] for row in rows], dtype=np.int64)
+        self._created = np.array([row[2] for row in rows], dtype=np.float64)
+        self._latency = np.array([row[3] for row in rows], dtype=np.float64)
+        self._matrix = np.array([np.frombuffer(row[1], dtype=np.float32) for row in rows]) if rows else None
+
+    def __len__(self):
+        return len(self._ids)
+
+    def _embed(self, question):
+        return normalize_rows(np.asarray([self.embeddings.embed_query(question)], dtype=np.float32))[0]
+
+    def lookup(self, question):
+        """
+        Find a stored answer for a question or one of its paraphrases
+
+        Returns:
+            tuple: (hit, vector) where hit is a dict with answer, context, question and
+            similarity (None on a miss) and vector is the question embedding, to be
+            passed to add() after a miss
+        """
+        start = time.perf_counter()
+        vector = self._embed(question)
+        hit = None
+        with self._lock:
+            if self._matrix is not None:
+                similarities = self._matrix @ vector
+                if self.ttl_seconds is not None:
+                    similarities[self._created < time.time() - self.ttl_seconds] = -np.inf
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    row_id = int(self._ids[best])
+                    cached_question, answer, context = self._conn.execute(
+                        "SELECT question, answer, context FROM answers WHERE id = ?", (row_id,)
+                    ).fetchone()
+                    self._conn.execute("UPDATE answers SET last_access = ? WHERE id = ?", (time.time(), row_id))
+                    self._conn.commit()
+                    hit = {
+                        'question': cached_question,
+                        'answer': answer,
+                        'context': context,
+                        'similarity': float(similarities[best]),
+                    }
+            elapsed = time.perf_counter() - start
+            self.lookup_seconds += elapsed
+            if hit is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.latency_saved_seconds += float(self._latency[best]) - elapsed
+        return hit, vector
+
+    def add(self, question, vector, answer, context, latency_seconds):
+        """Store a generated answer with the time it took to produce"""
+        vector = normalize_rows(np.asarray([vector], dtype=np.float32))[0]
+        now = time.time()
+        with self._lock:
+            row_id = self._conn.execute(
+                "INSERT INTO answers (model, question, answer, context, vector, latency, created, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (self.model_key, question, answer, context, vector.tobytes(), latency_seconds, now, now)
+            ).lastrowid
+            self._conn.commit()
+
+            count = self._conn.execute("SELECT COUNT(*) FROM answers WHERE model = ?", (self.model_key,)).fetchone()[0]
+            overflow = count - self.max_entries if self.max_entries is not None else 0
+            if overflow > 0:
+                # Evict the least recently used answers and re-read the remaining vectors
+                self._conn.execute(
+                    "DELETE FROM answers WHERE id IN ("
+                    "SELECT id FROM answers WHERE model = ? ORDER BY last_access ASC LIMIT ?)",
+                    (self.model_key, overflow)
+                )
+                self.evictions += overflow
+                self._load()
+                return
+            self._ids = np.append(self._ids, row_id)
+            self._created = np.append(self._created, now)
+            self._latency = np.append(self._latency, latency_seconds)
+            self._matrix = vector[None, :] if self._matrix is None else np.vstack((self._matrix, vector))
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM answers WHERE model = ?", (self.model_key,))
+            self._load()
+
+    def stats(self):
+        """Return cache counters as a dictionary"""
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'entries': len(self),
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'mean_lookup_ms': self.lookup_seconds * 1000 / total if total else 0.0,
+            'latency_saved_seconds': self.latency_saved_seconds,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,47 @@
+from functools import lru_cache
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken ships with langchain-openai, but keep a fallback
+    tiktoken = None
+
+
+@lru_cache(maxsize=None)
+def _get_encoding(model):
+    """Return the tiktoken encoding for a model, or None if it cannot be loaded"""
+    if tiktoken is None:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        # tiktoken downloads its vocabulary on first use, which fails offline
+        return None
+
+
+def count_tokens(text, model="gpt-4o-mini"):
+    """
+    Count the tokens in a piece of text with a fast local tokenizer
+
+    Uses tiktoken when available and falls back to the common estimate of
+    roughly four characters per token otherwise.
+    """
+    encoding = _get_encoding(model)
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text, max_tokens, model="gpt-4o-mini"):
+    """Cut text down to at most max_tokens tokens"""
+    if max_tokens <= 0:
+        return ""
+    encoding = _get_encoding(model)
+    if encoding is None:
+        return text[:max_tokens * 4]
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens])